@@ -0,0 +1,42 @@
+"""Raw playByPlay payload archive
+
+Every payload fetched is stored zstd-compressed under its content hash, the same
+hash the ingestion ledger records per game, so the ledger doubles as the
+gamePk -> payload index:
+
+    <ARCHIVE_DIR>/<first two hash chars>/<hash>.json.zst
+
+Identical payloads are stored once, and a blob is never rewritten. Unlike the
+hishel HTTP cache the archive never expires, which is what lets `reparse`
+rebuild the play tables without touching the network.
+"""
+
+from pathlib import Path
+
+import zstandard
+
+from .constants import ARCHIVE_DIR, ARCHIVE_ZSTD_LEVEL
+from .fileio import replace_atomically
+from .ledger import payload_hash
+
+
+def blob_path(digest: str) -> Path:
+    return Path(ARCHIVE_DIR) / digest[:2] / f"{digest}.json.zst"
+
+
+def archive_payload(content: bytes) -> str:
+    """Store `content` if it is not archived yet and return its hash"""
+    digest = payload_hash(content)
+    path = blob_path(digest)
+    if not path.exists():
+        compressed = zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL).compress(
+            content
+        )
+        # Write then rename, so a crash never leaves a truncated blob under a valid name
+        with replace_atomically(path) as tmp:
+            tmp.write_bytes(compressed)
+    return digest
+
+
+def read_payload(digest: str) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(blob_path(digest).read_bytes())
@@ -0,0 +1,188 @@
+"""Memory-bounded cache for season DataFrames
+
+Entries are evicted least-recently-used once their estimated size exceeds a byte
+budget. Each entry records the SeasonVersion it was built from; when ingestion
+(in this process or another) bumps a season's version, that season's entries are
+dropped on the next lookup.
+"""
+
+import functools
+import inspect
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from .constants import CACHE_MAX_BYTES, CACHE_VERSION_CHECK_SECONDS
+from .db import get_read_engine
+from .models import SeasonVersion
+
+
+def estimate_size(value: Any) -> int:
+    # polars frames and series; checked by duck typing so this module never imports polars
+    if hasattr(value, "estimated_size"):
+        return value.estimated_size()
+    return sys.getsizeof(value)
+
+
+def read_season_versions() -> dict[int, int]:
+    try:
+        with Session(get_read_engine()) as session:
+            rows = session.exec(select(SeasonVersion.season, SeasonVersion.version))
+            return dict(rows.all())
+    except OperationalError:
+        # Database predates the seasonversion table; nothing can be invalidated yet
+        return {}
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    size: int
+    season: int | None
+    version: Any
+
+
+class FrameCache:
+    def __init__(
+        self,
+        max_bytes: int,
+        version_source: Callable[[], dict[int, int]] = read_season_versions,
+        version_check_seconds: float = 5.0,
+    ):
+        self.max_bytes = max_bytes
+        self.version_source = version_source
+        self.version_check_seconds = version_check_seconds
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._lock = threading.RLock()
+        self._versions: dict[int, int] = {}
+        self._versions_checked = float("-inf")
+        self._versions_read = float("-inf")
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _version_for(self, season: int | None) -> Any:
+        # Entries not tied to a season depend on every season
+        if season is None:
+            return tuple(sorted(self._versions.items()))
+        return self._versions.get(season, 0)
+
+    def refresh_versions(self, force: bool = False) -> None:
+        """Re-read season versions and drop entries built from an older version"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._versions_checked < self.version_check_seconds:
+                return
+            # Claimed before reading, so other lookups skip the check meanwhile
+            self._versions_checked = now
+        # A database query, so other threads keep using the cache while it runs
+        versions = self.version_source()
+        with self._lock:
+            # Two reads may overlap; keep the one that started last
+            if now < self._versions_read:
+                return
+            self._versions_read = now
+            self._versions = versions
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if entry.version != self._version_for(entry.season)
+            ]
+            for key in stale:
+                self._drop(key)
+                self.invalidations += 1
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        self.refresh_versions()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def version_for(self, season: int | None) -> Any:
+        with self._lock:
+            return self._version_for(season)
+
+    def put(
+        self, key: Hashable, value: Any, season: int | None = None, version: Any = None
+    ) -> None:
+        """Store `value`; pass the `version` seen before computing it to avoid tagging
+        data read before an ingestion commit with the version after it"""
+        size = estimate_size(value)
+        with self._lock:
+            if version is None:
+                version = self._version_for(season)
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = CacheEntry(value, size, season, version)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def cached(self, season_arg: str | None = None) -> Callable:
+        """Memoize a function, tagging each result with the season named by `season_arg`"""
+
+        def decorator(func: Callable) -> Callable:
+            signature = inspect.signature(func)
+            missing = object()
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = (func.__qualname__, tuple(bound.arguments.items()))
+                value = self.get(key, missing)
+                if value is missing:
+                    season = bound.arguments[season_arg] if season_arg else None
+                    version = self.version_for(season)
+                    value = func(*args, **kwargs)
+                    self.put(key, value, season, version)
+                return value
+
+            wrapper.cache = self
+            return wrapper
+
+        return decorator
+
+
+frame_cache = FrameCache(
+    CACHE_MAX_BYTES, version_check_seconds=CACHE_VERSION_CHECK_SECONDS
+)
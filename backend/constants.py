@@ -1,6 +1,53 @@
+import os
+from typing import Literal
 
 BASE_URL = "https://statsapi.mlb.com/api/v1/"
-database = "sqlite:///playbyplay.db"
+# Schedule gameTypes: regular season, wild card, division series, league
+# championship, World Series
+GAME_TYPES = ("R", "F", "D", "L", "W")
+# Postseason games are stored and ingested like any other, but season stats (RE24,
+# run values, splits, win probability) only read these unless a caller opts in
+REGULAR_SEASON = ("R",)
+database = os.environ.get("MLB_DATABASE_URL", "sqlite:///playbyplay.db")
+
+# SQLite connection tuning: page cache per connection, memory-mapped I/O, and how
+# long a writer waits on another writer's lock before giving up
+SQLITE_CACHE_KIB = int(os.environ.get("MLB_SQLITE_CACHE_KIB", 64 * 1024))
+SQLITE_MMAP_BYTES = int(os.environ.get("MLB_SQLITE_MMAP_BYTES", 256 * 1024**2))
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.environ.get("MLB_SQLITE_BUSY_TIMEOUT", 30))
+# Bound parameters per statement: a little under SQLite's default limit of 32766,
+# leaving room for the ones outside a multi-row VALUES list
+SQLITE_MAX_VARIABLES = 32000
+
+# Memory budget for cached season frames, and how often cached entries are
+# checked against the season versions bumped by ingestion
+CACHE_MAX_BYTES = int(os.environ.get("MLB_CACHE_MAX_BYTES", 2 * 1024**3))
+CACHE_VERSION_CHECK_SECONDS = float(os.environ.get("MLB_CACHE_VERSION_CHECK_SECONDS", 5))
+
+# Cache-Control max-age for API responses; clients revalidate with the ETag after that
+RESPONSE_MAX_AGE = int(os.environ.get("MLB_RESPONSE_MAX_AGE", 60))
+
+# Write a sampling profile of the process to this path on exit (off when unset)
+PROFILE_PATH = os.environ.get("MLB_PROFILE")
+PROFILE_INTERVAL_MS = float(os.environ.get("MLB_PROFILE_INTERVAL_MS", 5))
+
+# Where per-season Parquet snapshots of the joined play frame are written
+SNAPSHOT_DIR = os.environ.get("MLB_SNAPSHOT_DIR", "snapshots")
+
+# Content-addressed store of every raw playByPlay payload fetched, zstd-compressed
+ARCHIVE_DIR = os.environ.get("MLB_ARCHIVE_DIR", "archive")
+ARCHIVE_ZSTD_LEVEL = int(os.environ.get("MLB_ARCHIVE_ZSTD_LEVEL", 9))
+
+# API job scheduler: worker threads, how long a request waits for its job before
+# answering 202 with a job to poll, and how long finished results are kept
+JOB_WORKERS = int(os.environ.get("MLB_JOB_WORKERS", 4))
+JOB_WAIT_SECONDS = float(os.environ.get("MLB_JOB_WAIT_SECONDS", 5))
+JOB_TTL_SECONDS = float(os.environ.get("MLB_JOB_TTL_SECONDS", 120))
+# Compute the latest season's leaderboards when the API starts
+PREWARM_ON_STARTUP = os.environ.get("MLB_PREWARM", "1") != "0"
+
+# Dimensions run value can be split by, shared by the split cube and its endpoint
+SplitKey = Literal["playerid", "opponent", "home", "month", "base_state", "outs"]
 
 def decode_base_state(state_code):
     """Convert base state code to readable format"""
@@ -1,9 +1,30 @@
+import asyncio
 import httpx
 import hishel
 from .constants import BASE_URL
 import time
-from sqlmodel import select
-from .models import PlayByPlay, InningsFinal, session, encode_base_state, Players
+from collections.abc import Iterable
+from dataclasses import dataclass
+from sqlalchemy import delete, func, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+from .archive import archive_payload
+from .db import chunked, session_scope
+from .ledger import mark_done, mark_failed, stored_hashes
+from .models import (
+    AggregatedGame,
+    CompactPlay,
+    PlayByPlay,
+    InningsFinal,
+    encode_base_state,
+    Players,
+    bump_season_versions,
+    bump_seasons,
+)
+from .metrics import count, timed, timer
+from .mlbmodels.incremental import reset_season
+from .payloads import Play, iter_plays
+from .storage import insert_compact_plays, uses_compact_plays
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -24,7 +45,26 @@ def get_response(url: str, client):
         return response
 
 
-def get_play_by_play_for_gameid(gameid: str | int) -> bool:
+@dataclass
+class ParsedGame:
+    gameid: int
+    plays: list[dict]
+    innings: list[dict]
+    payload_hash: str | None = None
+    # Games.status the payload was fetched for, recorded in the ingestion ledger
+    upstream_status: str | None = None
+
+
+def get_play_by_play_for_gameid(
+    gameid: str | int,
+    writer: "BatchWriter | None" = None,
+    upstream_status: str | None = None,
+) -> bool:
+    """Fetch and store one game. With a writer the rows are buffered into its next batch
+
+    Failures are recorded in the ingestion ledger so later runs retry them a bounded
+    number of times.
+    """
     url = BASE_URL + f"/game/{gameid}/playByPlay"
     max_retries = 1
     retries_left = max_retries + 1
@@ -32,8 +72,15 @@ def get_play_by_play_for_gameid(gameid: str | int) -> bool:
     while retries_left > 0:
         try:
             client = hishel.CacheClient(storage=hishel.SQLiteStorage())
-            response = get_response(url, client)
+            with timer("http_fetch"):
+                response = get_response(url, client)
+            count_response(response)
             break  # Success! Break out of the loop
+        except httpx.HTTPError as e:
+            # Transient errors were already retried by get_response; record it and move on
+            print(e, gameid)
+            mark_failed(gameid, repr(e), upstream_status)
+            return False
         except RuntimeError:
             retries_left -= 1
             if retries_left > 0:
@@ -43,111 +90,305 @@ def get_play_by_play_for_gameid(gameid: str | int) -> bool:
                 time.sleep(5)
             else:
                 print("All retry attempts exhausted.")
-                raise ValueError("Failed to get response after multiple attempts")
 
     if not response or response.status_code != 200:
-        raise ValueError("Bad response")
+        status = response.status_code if response else None
+        mark_failed(gameid, f"Bad response {status}", upstream_status)
+        return False
+
+    # Archived before parsing, so a payload the parser chokes on can be reparsed later
+    digest = archive_payload(response.content)
+    try:
+        plays, innings = build_play_by_play_rows(gameid, iter_plays(response.content))
+    except Exception as e:
+        print(e, gameid)
+        mark_failed(gameid, repr(e), upstream_status, digest)
+        return False
+    game = ParsedGame(gameid, plays, innings, digest, upstream_status)
+    if writer is not None:
+        writer.add(game)
+        return True
+    return save_games([game]) == 1
+
+
+def count_response(response: httpx.Response) -> None:
+    count("http_requests")
+    if response.extensions.get("from_cache"):
+        count("http_cache_hits")
+
+
+@timed("row_build")
+def build_play_by_play_rows(
+    gameid: str | int, all_plays: Iterable[Play]
+) -> tuple[list[dict], list[dict]]:
+    """Turn the plays of a playByPlay payload into PlayByPlay and InningsFinal rows
 
-    all_plays = response.json()["allPlays"]
+    Rows are plain dicts keyed by column name, ready for an executemany insert.
+    """
+    plays = []
+    innings = []
     scored = 0
     rolling_inning = "top1"
     runner_on_first_after = False
     runner_on_second_after = False
     runner_on_third_after = False
-    try:
-        for play in all_plays:
-            matchup = play.get("matchup", {})
-            about = play.get("about", {})
-            current_inning = about["inning"]
-            current_half = about["halfInning"]
-            if f"{current_half}{current_inning}" != rolling_inning:
-                rolling_inning = f"{current_half}{current_inning}"
-                runner_on_first_after = False
-                runner_on_second_after = False
-                runner_on_third_after = False
-                scored = 0
-            runners = play.get("runners", [])
-            runner_on_first = runner_on_first_after
-            runner_on_second = runner_on_second_after
-            runner_on_third = runner_on_third_after
-            runner_on_first_after = "postOnFirst" in matchup
-            runner_on_second_after = "postOnSecond" in matchup
-            runner_on_third_after = "postOnThird" in matchup
-            scored_on_play = 0
-            for runner in runners:
-                end = runner["movement"]["end"]
-                if end == "score":
-                    scored += 1
-                    scored_on_play += 1
-
-            pp = PlayByPlay(
-                gameid=gameid,
-                inning=current_inning,
-                inning_half=current_half,
-                batter=matchup["batter"]["id"],
-                pitcher=matchup["pitcher"]["id"],
-                runner_on_first=runner_on_first,
-                runner_on_second=runner_on_second,
-                runner_on_third=runner_on_third,
-                runner_on_first_after=runner_on_first_after,
-                runner_on_second_after=runner_on_second_after,
-                runner_on_third_after=runner_on_third_after,
-                outs=play["count"]["outs"],
-                runs_scored_before=scored - scored_on_play,
-                runs_scored=scored_on_play,
-                result=play["result"].get("event", "n/a").lower().replace(" ", "_"),
-                base_state_before=encode_base_state(
-                    runner_on_first, runner_on_second, runner_on_third
-                ),
-                base_state_after=encode_base_state(
-                    runner_on_first_after, runner_on_second_after, runner_on_third_after
-                ),
-                play_end_time=about["endTime"],
-                ab_index=about["atBatIndex"],
-            )
-            session.add(pp)
+    for play in all_plays:
+        matchup = play.matchup
+        about = play.about
+        current_inning = about.inning
+        current_half = about.halfInning
+        if f"{current_half}{current_inning}" != rolling_inning:
+            rolling_inning = f"{current_half}{current_inning}"
+            runner_on_first_after = False
+            runner_on_second_after = False
+            runner_on_third_after = False
+            scored = 0
+        runners = play.runners
+        runner_on_first = runner_on_first_after
+        runner_on_second = runner_on_second_after
+        runner_on_third = runner_on_third_after
+        runner_on_first_after = matchup.postOnFirst is not None
+        runner_on_second_after = matchup.postOnSecond is not None
+        runner_on_third_after = matchup.postOnThird is not None
+        scored_on_play = 0
+        for runner in runners:
+            end = runner.movement.end
+            if end == "score":
+                scored += 1
+                scored_on_play += 1
 
-            if play["count"]["outs"] == 3:
-                inning_final = InningsFinal(
+        pp = dict(
+            gameid=gameid,
+            inning=current_inning,
+            inning_half=current_half,
+            batter=matchup.batter.id,
+            pitcher=matchup.pitcher.id,
+            runner_on_first=runner_on_first,
+            runner_on_second=runner_on_second,
+            runner_on_third=runner_on_third,
+            runner_on_first_after=runner_on_first_after,
+            runner_on_second_after=runner_on_second_after,
+            runner_on_third_after=runner_on_third_after,
+            outs=play.count.outs,
+            runs_scored_before=scored - scored_on_play,
+            runs_scored=scored_on_play,
+            result=play.result.event.lower().replace(" ", "_"),
+            base_state_before=encode_base_state(
+                runner_on_first, runner_on_second, runner_on_third
+            ),
+            base_state_after=encode_base_state(
+                runner_on_first_after, runner_on_second_after, runner_on_third_after
+            ),
+            play_end_time=about.endTime,
+            ab_index=about.atBatIndex,
+        )
+        plays.append(pp)
+
+        if play.count.outs == 3:
+            innings.append(
+                dict(
                     gameid=gameid,
                     inning=current_inning,
                     inning_half=current_half,
                     runs_scored=scored,
                 )
-                session.add(inning_final)
+            )
+    return plays, innings
+
+
+def insert_play_by_play_rows(
+    session: Session, plays: list[dict], innings: list[dict]
+) -> None:
+    """Bulk insert rows with executemany on `session`, without committing.
+
+    Plays go to PlayByPlay or CompactPlay, whichever storage format the database uses.
+    """
+    if plays and uses_compact_plays(session.connection()):
+        insert_compact_plays(session, plays)
+    elif plays:
+        session.execute(insert(PlayByPlay), plays)
+    if innings:
+        session.execute(insert(InningsFinal), innings)
+    bump_season_versions(session, [row["gameid"] for row in plays])
 
-        session.commit()
+
+def store_games(session: Session, games: list[ParsedGame]) -> list[ParsedGame]:
+    """Write parsed games and their ledger entries on `session`, without committing.
+
+    Games whose payload hash matches the ledger only have their entry touched. Any
+    other game has its old rows replaced, and a season that had already folded a
+    replaced game into its running sums is reset so the next refresh re-aggregates
+    it. Returns the games whose rows were written.
+    """
+    hashes = stored_hashes(session, [game.gameid for game in games])
+    changed = [
+        game
+        for game in games
+        if game.payload_hash is None or hashes.get(game.gameid) != game.payload_hash
+    ]
+    gameids = [game.gameid for game in changed]
+    if gameids:
+        session.execute(delete(PlayByPlay).where(PlayByPlay.gameid.in_(gameids)))
+        session.execute(delete(CompactPlay).where(CompactPlay.gameid.in_(gameids)))
+        session.execute(delete(InningsFinal).where(InningsFinal.gameid.in_(gameids)))
+        aggregated = session.execute(
+            select(AggregatedGame.season)
+            .distinct()
+            .where(AggregatedGame.gameid.in_(gameids))
+        ).scalars()
+        for season in aggregated.all():
+            reset_season(session, season)
+    insert_play_by_play_rows(
+        session,
+        [row for game in changed for row in game.plays],
+        [row for game in changed for row in game.innings],
+    )
+    mark_done(
+        session,
+        [(game.gameid, game.payload_hash, game.upstream_status) for game in games],
+    )
+    return changed
+
+
+def save_games(games: list[ParsedGame]) -> int:
+    """Write games in a single transaction, rolling back if anything fails.
+
+    Returns the number of games written, 0 if the transaction failed.
+    """
+    try:
+        with timer("db_commit"), session_scope() as session:
+            changed = store_games(session, games)
     except Exception as e:
-        print(e, gameid)
-        session.rollback()
-        return False
+        print(e, [game.gameid for game in games])
+        count("games_failed", len(games))
+        return 0
+    count("games_written", len(games))
+    count("games_unchanged", len(games) - len(changed))
+    count("playbyplay_rows_written", sum(len(game.plays) for game in changed))
+    return len(games)
 
 
-def get_players_for_given_year(year: int):
-    """Fetch players from the MLB API for a given year and update their positions"""
-    r = httpx.get(BASE_URL + f"sports/1/players?season={year}")
-    players = r.json()["people"]
-
-    for player_data in players:
-        player_id = player_data["id"]
-
-        # Check if player exists in database
-        db_player = session.exec(
-            select(Players).where(Players.playerid == player_id)
-        ).first()
-
-        if not db_player:
-            # Create new player
-            db_player = Players(
-                playerid=player_id,
-                name=player_data.get("fullName", ""),
-                draft_year=player_data.get("draftYear"),
-                mlb_debut_date=player_data.get("mlbDebutDate"),
+class BatchWriter:
+    """Buffer parsed games and write them in large executemany transactions.
+
+    A batch is flushed once it holds `batch_size` PlayByPlay rows. If a batch
+    fails it is rolled back and retried one game per transaction, so a bad game
+    never takes the rest of the batch down with it and never lands half written.
+    Each game's ledger entry commits with its rows, so a crash mid-backfill leaves
+    only whole games marked done.
+    """
+
+    def __init__(self, batch_size: int = 5000):
+        self.batch_size = batch_size
+        self.pending: list[ParsedGame] = []
+        self.pending_rows = 0
+        self.written = 0
+        self.failed: list[str | int] = []
+
+    def add(self, game: ParsedGame) -> None:
+        self.pending.append(game)
+        self.pending_rows += len(game.plays)
+        if self.pending_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        games, self.pending, self.pending_rows = self.pending, [], 0
+        written = save_games(games)
+        if written:
+            self.written += written
+            return
+        for game in games:
+            if save_games([game]):
+                self.written += 1
+            else:
+                self.failed.append(game.gameid)
+                mark_failed(game.gameid, "write failed", game.upstream_status)
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.flush()
+
+
+async def fetch_players_for_years(years: list[int]) -> dict[int, list[dict]]:
+    """Fetch the player list of every season in `years` concurrently"""
+    async with httpx.AsyncClient(timeout=30) as client:
+        responses = await asyncio.gather(
+            *(client.get(BASE_URL + f"sports/1/players?season={year}") for year in years)
+        )
+    return {year: r.json()["people"] for year, r in zip(years, responses)}
+
+
+def merge_player_rows(people_by_year: dict[int, list[dict]]) -> dict[int, dict]:
+    """One Players row per player, with the primary position of every fetched season"""
+    rows = {}
+    for year, people in sorted(people_by_year.items()):
+        for player_data in people:
+            row = rows.setdefault(
+                player_data["id"],
+                dict(playerid=player_data["id"], years_positions={}),
             )
-        # Update position data for this year
-        if "primaryPosition" in player_data:
-            db_player.update_position(year, player_data["primaryPosition"]["code"])
+            row["name"] = player_data.get("fullName", "")
+            row["draft_year"] = player_data.get("draftYear")
+            row["mlb_debut_date"] = player_data.get("mlbDebutDate")
+            if "primaryPosition" in player_data:
+                row["years_positions"][str(year)] = player_data["primaryPosition"]["code"]
+    return rows
 
-        session.add(db_player)
 
-    session.commit()
+def upsert_players(rows: dict[int, dict], years: list[int]) -> int:
+    """Insert new players and merge season positions into existing ones.
+
+    One query prefetches the stored position maps so unchanged players are skipped.
+    The rest go through batched INSERT ... ON CONFLICT(playerid) statements that
+    json_patch the new seasons into the stored map. Returns the number of rows written.
+    """
+    with session_scope() as session:
+        existing = {
+            playerid: (name, positions or {})
+            for playerid, name, positions in session.exec(
+                select(Players.playerid, Players.name, Players.years_positions)
+            )
+        }
+        changed = [
+            row
+            for playerid, row in rows.items()
+            if playerid not in existing
+            or existing[playerid][0] != row["name"]
+            or any(
+                existing[playerid][1].get(year) != position
+                for year, position in row["years_positions"].items()
+            )
+        ]
+        for chunk in chunked(changed, len(Players.__table__.columns)):
+            stmt = sqlite_insert(Players).values(chunk)
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["playerid"],
+                    set_={
+                        "name": stmt.excluded.name,
+                        "draft_year": stmt.excluded.draft_year,
+                        "mlb_debut_date": stmt.excluded.mlb_debut_date,
+                        "years_positions": func.json_patch(
+                            func.coalesce(Players.years_positions, "{}"),
+                            stmt.excluded.years_positions,
+                        ),
+                    },
+                )
+            )
+        bump_seasons(session, years)
+    return len(changed)
+
+
+def get_players_for_years(years: list[int]) -> int:
+    """Fetch players for every season in `years` and upsert them in one pass"""
+    people_by_year = asyncio.run(fetch_players_for_years(years))
+    return upsert_players(merge_player_rows(people_by_year), years)
+
+
+def get_players_for_given_year(year: int):
+    """Fetch players from the MLB API for a given year and update their positions"""
+    return get_players_for_years([year])
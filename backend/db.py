@@ -0,0 +1,96 @@
+"""The shared SQLite engines and session helpers
+
+Every module reads and writes through the two engines here instead of creating
+its own. Both set the same connection pragmas:
+
+- journal_mode=WAL, so readers never block the writer and vice versa
+- synchronous=NORMAL, which is durable enough under WAL and avoids an fsync per commit
+- mmap_size and cache_size, so hot pages of the play tables stay in memory
+- a busy timeout, so a second writer waits for the lock instead of failing at once
+
+`get_engine()` is the writer. `get_read_engine()` opens the file with mode=ro,
+so analytics and API reads can never take the write lock. Both are created on
+first use rather than at import, so importing a module that touches the database
+costs nothing until it actually does.
+"""
+
+import threading
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+
+from sqlalchemy import Engine, event, make_url
+from sqlmodel import Session, create_engine
+
+from .constants import (
+    SQLITE_BUSY_TIMEOUT_SECONDS,
+    SQLITE_CACHE_KIB,
+    SQLITE_MAX_VARIABLES,
+    SQLITE_MMAP_BYTES,
+    database,
+)
+
+
+def make_engine(url: str = database, read_only: bool = False) -> Engine:
+    if read_only:
+        path = make_url(url).database
+        url = f"sqlite:///file:{path}?mode=ro&uri=true"
+    new_engine = create_engine(
+        url, connect_args={"timeout": SQLITE_BUSY_TIMEOUT_SECONDS}
+    )
+
+    @event.listens_for(new_engine, "connect")
+    def set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # Persistent in the file, so read-only connections pick it up too
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KIB}")
+        cursor.close()
+
+    return new_engine
+
+
+engines: dict[bool, Engine] = {}
+engines_lock = threading.Lock()
+
+
+def get_engine(read_only: bool = False) -> Engine:
+    """The shared writer engine (or read-only engine), created on first use"""
+    with engines_lock:
+        if read_only not in engines:
+            engines[read_only] = make_engine(read_only=read_only)
+        return engines[read_only]
+
+
+def get_read_engine() -> Engine:
+    return get_engine(read_only=True)
+
+
+def dispose_engines() -> None:
+    """Close every pooled connection; the next get_engine() builds a fresh engine"""
+    with engines_lock:
+        for engine in engines.values():
+            engine.dispose()
+        engines.clear()
+
+
+@contextmanager
+def session_scope(bind: Engine | None = None) -> Iterator[Session]:
+    """A session that commits when the block succeeds and rolls back when it raises"""
+    with Session(bind or get_engine()) as session:
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+
+def chunked(rows: Sequence[dict], columns: int) -> Iterator[Sequence[dict]]:
+    """`rows` in slices small enough for one multi-row INSERT each, at `columns`
+    bound parameters per row"""
+    size = max(SQLITE_MAX_VARIABLES // columns, 1)
+    for i in range(0, len(rows), size):
+        yield rows[i : i + size]
@@ -0,0 +1,25 @@
+"""Crash- and concurrency-safe file writes"""
+
+import os
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def replace_atomically(path: Path) -> Iterator[Path]:
+    """Yield a fresh temporary path next to `path` and rename it over `path` when
+    the block succeeds.
+
+    The temporary name is unique, so concurrent writers never share a file, and
+    readers see either the old file or the new one, never a partial write.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        yield Path(tmp)
+        os.replace(tmp, path)
+    finally:
+        Path(tmp).unlink(missing_ok=True)
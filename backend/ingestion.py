@@ -0,0 +1,138 @@
+"""Concurrent play-by-play ingestion
+
+Games are fetched through one shared, pooled hishel cache client with a bounded
+number of requests in flight and a per-host rate limit. Parsed rows are handed
+to a single writer task so SQLite only ever sees one writer. Failed games are
+recorded in the ingestion ledger by that writer too.
+"""
+
+import asyncio
+import time
+
+import hishel
+import httpx
+import tqdm
+from tenacity import (
+    retry,
+    stop_after_attempt,
+    wait_exponential,
+    retry_if_exception_type,
+)
+
+from .constants import BASE_URL
+from .data_collection import (
+    BatchWriter,
+    ParsedGame,
+    build_play_by_play_rows,
+    count_response,
+)
+from .archive import archive_payload
+from .ledger import mark_failed
+from .metrics import timer
+from .payloads import iter_plays
+
+
+class HostRateLimiter:
+    """Space out request starts so each host sees at most `rate` requests per second"""
+
+    def __init__(self, rate: float | None):
+        self.interval = 1 / rate if rate else 0.0
+        self._next_slot: dict[str, float] = {}
+
+    async def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    reraise=True,
+    retry=retry_if_exception_type((httpx.ConnectError, httpx.TimeoutException)),
+    wait=wait_exponential(multiplier=3, min=1, max=30),
+)
+async def get_response_async(
+    url: str, client: httpx.AsyncClient, limiter: HostRateLimiter
+) -> httpx.Response:
+    await limiter.wait(httpx.URL(url).host)
+    return await client.get(url, timeout=5)
+
+
+async def fetch_game(
+    gameid: int,
+    client: httpx.AsyncClient,
+    limiter: HostRateLimiter,
+    semaphore: asyncio.Semaphore,
+    queue: asyncio.Queue,
+    upstream_status: str | None = None,
+) -> None:
+    """Fetch and parse one game, then pass it (or the error) to the writer"""
+    url = BASE_URL + f"/game/{gameid}/playByPlay"
+    async with semaphore:
+        digest = None
+        try:
+            with timer("http_fetch"):
+                response = await get_response_async(url, client, limiter)
+            count_response(response)
+            if response.status_code != 200:
+                raise ValueError(f"Bad response {response.status_code}")
+            digest = archive_payload(response.content)
+            plays, innings = build_play_by_play_rows(
+                gameid, iter_plays(response.content)
+            )
+            item = ParsedGame(gameid, plays, innings, digest, upstream_status)
+        except Exception as e:
+            print(e, gameid)
+            item = (gameid, repr(e), upstream_status, digest)
+        # Holding the slot until the writer accepts the rows bounds parsed games in memory
+        await queue.put(item)
+
+
+async def write_games(queue: asyncio.Queue, total: int, batch_size: int) -> int:
+    """Single writer: buffer games into batched transactions as they arrive"""
+    writer = BatchWriter(batch_size)
+    with tqdm.tqdm(total=total) as progress:
+        while (item := await queue.get()) is not None:
+            # Run the blocking writes off the event loop so fetches keep going
+            if isinstance(item, ParsedGame):
+                await asyncio.to_thread(writer.add, item)
+            else:
+                await asyncio.to_thread(mark_failed, *item)
+            progress.update()
+    await asyncio.to_thread(writer.flush)
+    return writer.written
+
+
+async def ingest_games(
+    games: dict[int, str | None],
+    concurrency: int = 8,
+    rate_limit: float | None = 10.0,
+    batch_size: int = 5000,
+) -> int:
+    """Fetch every game in `games` (gameid -> schedule status) concurrently and write
+    them through one writer task.
+
+    Returns the number of games written successfully.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = HostRateLimiter(rate_limit)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    async with hishel.AsyncCacheClient(
+        storage=hishel.AsyncSQLiteStorage(), limits=limits
+    ) as client:
+        writer = asyncio.create_task(write_games(queue, len(games), batch_size))
+        await asyncio.gather(
+            *(
+                fetch_game(gameid, client, limiter, semaphore, queue, status)
+                for gameid, status in games.items()
+            )
+        )
+        await queue.put(None)
+        return await writer
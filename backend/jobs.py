@@ -0,0 +1,120 @@
+"""In-process job scheduler for expensive computations
+
+Jobs run on a small thread pool, so blocking SQLite and polars work never holds
+the event loop. Identical work is single-flighted: submitting a key that is
+already pending or running returns the existing job instead of starting a second
+computation. Once a job finishes the next submission of its key starts afresh
+(repeat work is the frame cache's business), but the job itself keeps its result
+for `JOB_TTL_SECONDS`, so a client that was told to poll can still collect it.
+
+Futures are `concurrent.futures` ones rather than asyncio ones, so a job
+outlives the request (and event loop) that submitted it.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from .constants import JOB_TTL_SECONDS, JOB_WORKERS
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    future: Future
+    created: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "running" if self.future.running() else "pending"
+        if self.future.cancelled() or self.future.exception() is not None:
+            return "failed"
+        return "done"
+
+    def describe(self) -> dict:
+        described = dict(id=self.id, status=self.status)
+        if self.future.cancelled():
+            described["error"] = "cancelled"
+        elif described["status"] == "failed":
+            described["error"] = repr(self.future.exception())
+        return described
+
+
+class JobScheduler:
+    def __init__(self, workers: int, ttl: float):
+        self.workers = workers
+        self.ttl = ttl
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._by_key: dict[str, Job] = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="job")
+        return self._executor
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        for job in [
+            job for job in self._jobs.values() if job.finished and job.finished < cutoff
+        ]:
+            del self._jobs[job.id]
+
+    def _finish(self, job: Job) -> None:
+        with self._lock:
+            job.finished = time.monotonic()
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+    def submit(self, key: str, func: Callable[[], Any]) -> Job:
+        """The job computing `key`, started with `func` unless one is already in flight"""
+        with self._lock:
+            self._expire()
+            if key in self._by_key:
+                return self._by_key[key]
+            job = Job(uuid.uuid4().hex, key, self.executor.submit(func))
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+        # Outside the lock: a job that already finished runs the callback right here
+        job.future.add_done_callback(lambda _: self._finish(job))
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    async def run(self, key: str, func: Callable[[], Any], wait: float) -> Job:
+        """Submit `key` and wait up to `wait` seconds for it. Check `job.status`"""
+        job = self.submit(key, func)
+        waiter = asyncio.wrap_future(job.future)
+        # Returns when the job finishes or the wait times out, without cancelling the
+        # shared job and without raising the job's exception; job.status reports it
+        await asyncio.wait([waiter], timeout=wait)
+        # The outcome is read from the job, so mark it retrieved for asyncio's sake
+        waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire()
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in set(statuses)}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+scheduler = JobScheduler(JOB_WORKERS, JOB_TTL_SECONDS)
@@ -0,0 +1,156 @@
+"""Ingestion ledger: which games are stored, from which payload, and what failed
+
+A game's ledger row is written in the same transaction as its PlayByPlay and
+InningsFinal rows, so after a crash every game marked done is complete and every
+other game has nothing committed. The backfill asks the ledger which games still
+need work instead of inspecting play rows:
+
+- games never fetched
+- games whose schedule status changed since they were fetched (e.g. a suspended
+  game that has since been completed)
+- failed games with attempts left
+"""
+
+import datetime
+import hashlib
+
+from sqlalchemy import case, func, or_, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session
+
+from .db import chunked, get_read_engine, session_scope
+from .models import Games, IngestionLedger
+
+# Failed games are retried on this many runs before needing --retry-failed
+MAX_ATTEMPTS = 3
+# Schedule states with no play-by-play to fetch yet, or ever
+UNPLAYED_STATUSES = ("Scheduled", "Pre-Game", "Warmup", "Postponed", "Cancelled")
+
+
+def payload_hash(content: bytes) -> str:
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+def games_to_fetch(retry_failed: bool = False) -> dict[int, str | None]:
+    """gameid -> schedule status of every game that needs fetching, newest first"""
+    retry = IngestionLedger.status == "failed"
+    if not retry_failed:
+        retry &= IngestionLedger.attempts < MAX_ATTEMPTS
+    query = (
+        select(Games.gameid, Games.status)
+        .outerjoin(IngestionLedger, IngestionLedger.gameid == Games.gameid)
+        .where(or_(Games.status.is_(None), Games.status.not_in(UNPLAYED_STATUSES)))
+        .where(
+            or_(
+                IngestionLedger.gameid.is_(None),
+                IngestionLedger.upstream_status.is_distinct_from(Games.status),
+                retry,
+            )
+        )
+        .order_by(Games.game_date.desc())
+    )
+    with Session(get_read_engine()) as session:
+        return dict(session.execute(query).all())
+
+
+def stored_hashes(session: Session, gameids: list[int]) -> dict[int, str]:
+    rows = session.execute(
+        select(IngestionLedger.gameid, IngestionLedger.payload_hash)
+        .where(IngestionLedger.gameid.in_(gameids))
+        .where(IngestionLedger.status == "done")
+    )
+    return {gameid: digest for gameid, digest in rows if digest is not None}
+
+
+def upsert_entries(session: Session, rows: list[dict]) -> None:
+    rows = [
+        dict(row, attempts=int(row["status"] == "failed"), updated_at=now())
+        for row in rows
+    ]
+    for chunk in chunked(rows, len(IngestionLedger.__table__.columns)):
+        stmt = sqlite_insert(IngestionLedger).values(chunk)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["gameid"],
+                set_={
+                    "status": stmt.excluded.status,
+                    "payload_hash": func.coalesce(
+                        stmt.excluded.payload_hash, IngestionLedger.payload_hash
+                    ),
+                    "upstream_status": stmt.excluded.upstream_status,
+                    # Consecutive failures: storing the game starts the count over
+                    "attempts": case(
+                        (stmt.excluded.status == "done", 0),
+                        (
+                            IngestionLedger.status == "failed",
+                            IngestionLedger.attempts + 1,
+                        ),
+                        else_=1,
+                    ),
+                    "error": stmt.excluded.error,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+        )
+
+
+def mark_done(
+    session: Session, games: list[tuple[int, str | None, str | None]]
+) -> None:
+    """Record (gameid, payload_hash, upstream_status) as stored, inside the caller's
+    transaction so the entries commit with the rows"""
+    upsert_entries(
+        session,
+        [
+            dict(
+                gameid=gameid,
+                status="done",
+                payload_hash=digest,
+                upstream_status=upstream_status,
+                error=None,
+            )
+            for gameid, digest, upstream_status in games
+        ],
+    )
+
+
+def adopt_schedule_status(session: Session, season: int) -> None:
+    """Give done games fetched without a known schedule status (e.g. seeded by the
+    migration) their current one, so loading statuses for the first time does
+    not make every finished game look changed"""
+    session.execute(
+        text(
+            "UPDATE ingestionledger SET upstream_status = "
+            "(SELECT status FROM games WHERE games.gameid = ingestionledger.gameid) "
+            "WHERE upstream_status IS NULL AND status = 'done' "
+            "AND gameid IN (SELECT gameid FROM games WHERE season = :season)"
+        ),
+        {"season": season},
+    )
+
+
+def mark_failed(
+    gameid: int,
+    error: str,
+    upstream_status: str | None = None,
+    payload_hash: str | None = None,
+) -> None:
+    """Record a failed game, with the hash of its payload if one was fetched and
+    archived, so `reparse` can retry it after a parser fix"""
+    with session_scope() as session:
+        upsert_entries(
+            session,
+            [
+                dict(
+                    gameid=gameid,
+                    status="failed",
+                    payload_hash=payload_hash,
+                    upstream_status=upstream_status,
+                    error=error[:500],
+                )
+            ],
+        )
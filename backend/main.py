@@ -1,21 +1,283 @@
-from fastapi import FastAPI
-from .mlbmodels.re24 import *
-app = FastAPI()
+"""The HTTP API
+
+Importing this module stays cheap: the models, and with them polars and numpy,
+are imported by the routes that use them, and the database engines are created
+in the lifespan hook. The startup prewarm job then loads the models in the
+background, so a new worker starts answering quickly and its first requests
+still find the models imported.
+"""
+
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Literal
+
+from fastapi import Depends, FastAPI, Query, Request
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from .cache import frame_cache
+from .constants import PREWARM_ON_STARTUP, SplitKey
+from .db import dispose_engines, get_engine, get_read_engine
+from .jobs import scheduler
+from .metrics import render
+from .profiling import start_profiler_from_env
+from .serving import Paging, serve_frame, serve_job
+
+
+def prewarm_latest_season():
+    """Build the latest season's frames and stored leaderboards, so the first
+    requests for it are served from the cache"""
+    from .mlbmodels.plays import available_seasons
+    from .mlbmodels.re24 import (
+        get_batters_run_value,
+        get_pitchers_run_value,
+        get_re24_specific_year,
+        position_run_values,
+        team_run_values,
+    )
+
+    seasons = available_seasons()
+    if not seasons:
+        return
+    year = max(seasons)
+    get_re24_specific_year(year)
+    get_batters_run_value(year)
+    get_pitchers_run_value(year)
+    team_run_values(year)
+    position_run_values(year)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_engine()
+    get_read_engine()
+    if PREWARM_ON_STARTUP:
+        scheduler.submit("prewarm", prewarm_latest_season)
+    yield
+    scheduler.shutdown()
+    dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
+start_profiler_from_env()
 
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    return frame_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage timings and counters in the Prometheus text format"""
+    cache = frame_cache.stats()
+    return render(
+        {
+            "mlb_frame_cache_hits": cache["hits"],
+            "mlb_frame_cache_misses": cache["misses"],
+            "mlb_frame_cache_hit_ratio": cache["hit_ratio"],
+            "mlb_frame_cache_bytes": cache["size_bytes"],
+            "mlb_frame_cache_entries": cache["entries"],
+            **{
+                f"mlb_jobs_{status}": count
+                for status, count in scheduler.stats().items()
+            },
+        }
+    )
+
+@app.get("/jobs/{job_id}")
+async def job_status(request: Request, job_id: str, paging: Paging = Depends()):
+    """Poll a job a frame endpoint answered 202 for; returns its frame once done"""
+    return await serve_job(request, job_id, paging)
+
+@app.get("/re24")
+async def re24_range(
+    request: Request,
+    seasons: list[int] | None = Query(None),
+    start: date | None = None,
+    end: date | None = None,
+    paging: Paging = Depends(),
+):
+    from .mlbmodels.re24 import re24_for_range
+
+    return await serve_frame(
+        request, lambda: re24_for_range(seasons, start, end), seasons, paging
+    )
+
+@app.get("/run-value/batters")
+async def run_value_batters_range(
+    request: Request,
+    seasons: list[int] | None = Query(None),
+    start: date | None = None,
+    end: date | None = None,
+    min_ab: int = 50,
+    paging: Paging = Depends(),
+):
+    from .mlbmodels.re24 import run_values_for_range
+
+    return await serve_frame(
+        request,
+        lambda: run_values_for_range("batter", seasons, start, end, min_ab),
+        seasons,
+        paging,
+    )
+
+@app.get("/run-value/pitchers")
+async def run_value_pitchers_range(
+    request: Request,
+    seasons: list[int] | None = Query(None),
+    start: date | None = None,
+    end: date | None = None,
+    min_ab: int = 50,
+    paging: Paging = Depends(),
+):
+    from .mlbmodels.re24 import run_values_for_range
+
+    return await serve_frame(
+        request,
+        lambda: run_values_for_range("pitcher", seasons, start, end, min_ab),
+        seasons,
+        paging,
+    )
+
 @app.get("/re24/{year}")
-async def re24(year: int):
-    return get_re24_specific_year(year).to_dicts()
+async def re24(
+    request: Request,
+    year: int,
+    method: Literal["empirical", "markov"] = "empirical",
+    paging: Paging = Depends(),
+):
+    """The season's RE24 table: mean runs to the end of the inning per base-out
+    state, or with method=markov, solved from the state transitions"""
+    from .mlbmodels.markov import markov_re24
+    from .mlbmodels.re24 import get_re24_specific_year
+
+    if method == "markov":
+        return await serve_frame(request, lambda: markov_re24([year]), [year], paging)
+    return await serve_frame(
+        request, lambda: get_re24_specific_year(year), [year], paging
+    )
 
 
 @app.get("/run-value/batters/{year}")
-async def run_value_batters(year: int):
-    return get_batters_run_value(year).to_dicts()
+async def run_value_batters(
+    request: Request,
+    year: int,
+    min_ab: int = 50,
+    paging: Paging = Depends(),
+):
+    from .mlbmodels.re24 import get_batters_run_value
+
+    return await serve_frame(
+        request, lambda: get_batters_run_value(year, min_ab), [year], paging
+    )
 
 @app.get("/run-value/pitchers/{year}")
-async def run_value_batters(year: int):
-    return get_pitchers_run_value(year).to_dicts()
\ No newline at end of file
+async def run_value_pitchers(
+    request: Request,
+    year: int,
+    min_ab: int = 50,
+    paging: Paging = Depends(),
+):
+    from .mlbmodels.re24 import get_pitchers_run_value
+
+    return await serve_frame(
+        request, lambda: get_pitchers_run_value(year, min_ab), [year], paging
+    )
+
+@app.get("/run-value/teams/{year}")
+async def run_value_teams(request: Request, year: int, paging: Paging = Depends()):
+    from .mlbmodels.re24 import team_run_values
+
+    return await serve_frame(request, lambda: team_run_values(year), [year], paging)
+
+@app.get("/run-value/positions/{year}")
+async def run_value_positions(
+    request: Request, year: int, paging: Paging = Depends()
+):
+    from .mlbmodels.re24 import position_run_values
+
+    return await serve_frame(
+        request, lambda: position_run_values(year), [year], paging
+    )
+
+@app.get("/run-value/splits/{year}")
+async def run_value_splits(
+    request: Request,
+    year: int,
+    role: Literal["batter", "pitcher"] = "batter",
+    by: list[SplitKey] = Query(["playerid"]),
+    playerid: int | None = None,
+    opponent: int | None = None,
+    home: bool | None = None,
+    month: int | None = Query(None, ge=1, le=12),
+    base_state: int | None = Query(None, ge=0, le=7),
+    outs: int | None = Query(None, ge=0, le=2),
+    min_pa: int = 0,
+    paging: Paging = Depends(),
+):
+    """Run value by any combination of player, opponent, home/away, month and
+    base-out state, e.g. ?by=playerid&by=month&home=false"""
+    from .mlbmodels.splits import split_run_values
+
+    filters = dict(
+        playerid=playerid,
+        opponent=opponent,
+        home=home,
+        month=month,
+        base_state=base_state,
+        outs=outs,
+    )
+    return await serve_frame(
+        request,
+        lambda: split_run_values(year, role, by, filters, min_pa),
+        [year],
+        paging,
+    )
+
+@app.get("/win-probability")
+async def win_probability(
+    inning: int = Query(ge=1),
+    half: Literal["top", "bottom"] = "top",
+    outs: int = Query(0, ge=0, le=2),
+    base_state: int = Query(0, ge=0, le=7),
+    score_diff: int = 0,
+):
+    """Home win probability and leverage index for one game state"""
+    from .mlbmodels.win_probability import get_win_probability_grid
+
+    grid = await run_in_threadpool(get_win_probability_grid)
+    return grid.lookup(inning, half, outs, base_state, score_diff)
+
+@app.get("/win-probability/grid")
+async def win_probability_grid(request: Request, paging: Paging = Depends()):
+    from .mlbmodels.win_probability import get_win_probability_grid
+
+    return await serve_frame(
+        request, lambda: get_win_probability_grid().frame(), None, paging
+    )
+
+@app.get("/win-probability/{year}")
+async def win_probability_year(request: Request, year: int, paging: Paging = Depends()):
+    from .mlbmodels.win_probability import get_win_probability_year
+
+    return await serve_frame(
+        request,
+        lambda: get_win_probability_year(year).select(
+            "gameid",
+            "inning",
+            "inning_half",
+            "ab_index",
+            "batter",
+            "pitcher",
+            "previous_outs",
+            "base_state_before",
+            "score_diff",
+            "home_win_probability",
+            "leverage_index",
+        ),
+        [year],
+        paging,
+    )
@@ -0,0 +1,154 @@
+"""In-process timing histograms and counters for the hot paths
+
+Stages are timed with `timer("stage")` (a context manager) or `@timed("stage")`,
+and row or event counts are added with `count("kind", n)`. Everything lives in one
+process-wide registry that `render()` turns into the Prometheus text format for
+`/metrics`, and `summary()` turns into a short table for the CLI.
+
+Stage names used across the code base:
+
+- http_fetch: one playByPlay request, including retries and cache lookups
+- json_parse: decoding a playByPlay payload
+- row_build: turning decoded plays into PlayByPlay and InningsFinal rows
+- db_commit: one ingestion write transaction
+- season_load: reading a season's play frame from SQLite or its snapshot
+- re_compute: building an RE24 table
+- serialize: encoding an API response body
+"""
+
+import bisect
+import functools
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a single fast decode up to a cold multi-season load
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: dict[str, Histogram] = defaultdict(Histogram)
+        self.counters: dict[str, int] = defaultdict(int)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+
+    def add(self, kind: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[kind] += n
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+registry = Registry()
+
+
+@contextmanager
+def timer(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(stage, time.perf_counter() - start)
+
+
+def timed(stage: str) -> Callable:
+    """Decorator form of `timer`"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(kind: str, n: int = 1) -> None:
+    registry.add(kind, n)
+
+
+def render(extra_gauges: dict[str, float | int | None] | None = None) -> str:
+    """Every histogram and counter in the Prometheus text exposition format"""
+    lines = [
+        "# HELP mlb_stage_seconds Time spent per call in each instrumented stage",
+        "# TYPE mlb_stage_seconds histogram",
+    ]
+    with registry._lock:
+        histograms = {
+            k: (list(h.counts), h.sum, h.count) for k, h in registry.histograms.items()
+        }
+        counters = dict(registry.counters)
+    for stage, (counts, total, n) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, counts):
+            cumulative += bucket
+            lines.append(
+                f'mlb_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+            )
+        lines.append(f'mlb_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {n}')
+        lines.append(f'mlb_stage_seconds_sum{{stage="{stage}"}} {total}')
+        lines.append(f'mlb_stage_seconds_count{{stage="{stage}"}} {n}')
+    lines += [
+        "# HELP mlb_events_total Rows processed and cache lookups, by kind",
+        "# TYPE mlb_events_total counter",
+    ]
+    for kind, value in sorted(counters.items()):
+        lines.append(f'mlb_events_total{{kind="{kind}"}} {value}')
+    for name, value in sorted((extra_gauges or {}).items()):
+        if value is not None:
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> str:
+    """Per-stage call counts and times, and every counter, as a plain-text table"""
+    with registry._lock:
+        histograms = {k: (h.sum, h.count) for k, h in registry.histograms.items()}
+        counters = dict(registry.counters)
+    if not histograms and not counters:
+        return ""
+    lines = [f"{'stage':<14}{'calls':>10}{'total s':>12}{'mean ms':>12}"]
+    for stage, (total, n) in sorted(histograms.items(), key=lambda item: -item[1][0]):
+        lines.append(f"{stage:<14}{n:>10}{total:>12.3f}{1000 * total / n:>12.2f}")
+    for kind, value in sorted(counters.items()):
+        lines.append(f"{kind:<24}{value:>12}")
+    return "\n".join(lines)
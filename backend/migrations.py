@@ -0,0 +1,133 @@
+"""Bring an existing playbyplay.db up to the current schema"""
+
+import json
+
+from sqlalchemy import Engine, inspect, text
+from sqlmodel import SQLModel
+
+from .db import get_engine
+# Imported for its side effect of registering every table on SQLModel.metadata
+from . import models  # noqa: F401
+
+
+def add_missing_columns(engine: Engine) -> None:
+    """Add nullable columns that exist on the models but not in the database yet"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(engine.dialect)
+                    conn.execute(
+                        text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                    )
+
+
+def backfill_game_seasons(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "UPDATE games SET season = CAST(substr(game_date, 1, 4) AS INTEGER) "
+                "WHERE season IS NULL"
+            )
+        )
+
+
+def dedupe_players(engine: Engine) -> None:
+    """Merge duplicate players rows so the unique index on playerid can be created"""
+    with engine.begin() as conn:
+        if not inspect(conn).has_table("players"):
+            return
+        duplicates = conn.execute(
+            text(
+                "SELECT playerid, id, years_positions FROM players WHERE playerid IN "
+                "(SELECT playerid FROM players GROUP BY playerid HAVING count(*) > 1) "
+                "ORDER BY playerid, id"
+            )
+        ).all()
+        merged: dict[int, tuple[int, dict]] = {}
+        for playerid, row_id, positions in duplicates:
+            keep_id, keep_positions = merged.setdefault(playerid, (row_id, {}))
+            keep_positions.update(json.loads(positions) if positions else {})
+        for playerid, (keep_id, positions) in merged.items():
+            conn.execute(
+                text("UPDATE players SET years_positions = :positions WHERE id = :id"),
+                {"positions": json.dumps(positions), "id": keep_id},
+            )
+            conn.execute(
+                text("DELETE FROM players WHERE playerid = :playerid AND id != :id"),
+                {"playerid": playerid, "id": keep_id},
+            )
+
+
+def dedupe_games(engine: Engine) -> None:
+    """Drop repeated games rows left by reloading a schedule or by a game listed on
+    two dates (postponed or suspended), so the unique index on gameid can be
+    created. The most recently added row is kept, as it has the latest date."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "DELETE FROM games WHERE id NOT IN "
+                "(SELECT max(id) FROM games GROUP BY gameid)"
+            )
+        )
+
+
+def create_missing_indexes(engine: Engine) -> None:
+    """create_all only builds indexes for new tables, so create the rest one by one.
+
+    An index whose uniqueness changed on the model is dropped and rebuilt.
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {
+                index["name"]: bool(index["unique"])
+                for index in inspector.get_indexes(table.name)
+            }
+            for index in table.indexes:
+                if index.name in existing and existing[index.name] != index.unique:
+                    index.drop(conn)
+                    index.create(conn)
+                else:
+                    index.create(conn, checkfirst=True)
+        # Refresh planner statistics so SQLite actually picks the new indexes
+        conn.execute(text("ANALYZE"))
+
+
+def seed_ingestion_ledger(engine: Engine) -> None:
+    """Mark games ingested before the ledger existed as done.
+
+    Only games with at least 17 distinct finished half-innings and no repeated
+    ones count. That leaves out shortened games, which the old top-of-the-9th
+    check fetched again on every run and so stored more than once; the next
+    backfill replaces their rows. The payload hash of a seeded game is unknown,
+    so the next fetch of one always rewrites its rows.
+    """
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM ingestionledger LIMIT 1")).first():
+            return
+        conn.execute(
+            text(
+                "INSERT INTO ingestionledger (gameid, status, upstream_status, attempts, updated_at) "
+                "SELECT g.gameid, 'done', g.status, 0, datetime('now') FROM games g "
+                "JOIN (SELECT gameid FROM inningsfinal GROUP BY gameid "
+                "HAVING count(DISTINCT inning || inning_half) >= 17 "
+                "AND count(*) = count(DISTINCT inning || inning_half)) i "
+                "ON i.gameid = g.gameid"
+            )
+        )
+
+
+def migrate_db(engine: Engine | None = None) -> None:
+    engine = engine or get_engine()
+    SQLModel.metadata.create_all(engine)
+    add_missing_columns(engine)
+    backfill_game_seasons(engine)
+    dedupe_games(engine)
+    dedupe_players(engine)
+    seed_ingestion_ledger(engine)
+    create_missing_indexes(engine)
@@ -0,0 +1,263 @@
+"""Incremental RE24 and run-value refresh
+
+Instead of rebuilding a season from scratch, each refresh folds only the games
+that are not yet in AggregatedGame into two sets of running sums:
+
+- RE24Accumulator: runs-after and count per (season, base_state, outs)
+- PlayerStateCounts: per player and state, PA starts, PA ends and runs
+
+The season's RE table is then recomputed from the 24 accumulators, and every
+player's run value is recomputed from their state counts against that table.
+That last step is a small join, so a shifted RE table costs nothing extra.
+
+`bulk-add` refreshes every season with new games once it has written them; the
+`refresh` command does the same by hand, e.g. after `reparse`.
+"""
+
+import polars as pl
+from sqlalchemy import Select, delete, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session
+
+from backend.constants import REGULAR_SEASON, decode_base_state
+from ..db import chunked, get_read_engine, session_scope
+from ..models import (
+    AggregatedGame,
+    BatterRunValue,
+    Games,
+    InningsFinal,
+    PitcherRunValue,
+    PlayerStateCounts,
+    RE24Accumulator,
+    YearlyRE24,
+    bump_seasons,
+)
+from .plays import load_plays_from_db, season_where
+
+ROLES = {"batter": BatterRunValue, "pitcher": PitcherRunValue}
+
+
+def unaggregated(query: Select) -> Select:
+    """Restrict `query` to regular-season games with play data that have not been
+    aggregated yet.
+
+    InningsFinal is written with the plays in either storage format, and plays
+    without it never reach the season frame anyway.
+    """
+    return (
+        query.select_from(InningsFinal)
+        .join(Games, Games.gameid == InningsFinal.gameid)
+        .where(Games.game_type.in_(REGULAR_SEASON))
+        .where(InningsFinal.gameid.not_in(select(AggregatedGame.gameid)))
+        .distinct()
+    )
+
+
+def pending_games(session: Session, season: int) -> list[int]:
+    query = unaggregated(select(InningsFinal.gameid)).where(Games.season == season)
+    return list(session.execute(query).scalars())
+
+
+def pending_seasons() -> list[int]:
+    """Seasons with games that `refresh_season` would fold in"""
+    query = unaggregated(select(Games.season)).order_by(Games.season)
+    with Session(get_read_engine()) as session:
+        return list(session.execute(query).scalars())
+
+
+def state_deltas(plays: pl.DataFrame) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """RE24 sums and per-player state counts contributed by a batch of plays"""
+    re_delta = plays.group_by(
+        pl.col("base_state_before").alias("base_state"),
+        pl.col("previous_outs").alias("outs"),
+    ).agg(pl.col("runs_after").sum().alias("runs_sum"), pl.len().alias("count"))
+
+    start_state = pl.col("base_state_before") * 3 + pl.col("previous_outs")
+    end_state = pl.col("base_state_after") * 3 + pl.col("outs")
+    counts = []
+    for role in ROLES:
+        starts = plays.group_by(
+            pl.col(role).alias("playerid"), start_state.alias("state")
+        ).agg(pl.len().alias("starts"), pl.col("runs_scored").sum().alias("runs"))
+        # Plays ending the inning leave 0 expectancy, so they have no end state
+        ends = (
+            plays.filter(pl.col("outs") < 3)
+            .group_by(pl.col(role).alias("playerid"), end_state.alias("state"))
+            .agg(pl.len().alias("ends"))
+        )
+        counts.append(
+            starts.join(ends, on=["playerid", "state"], how="full", coalesce=True)
+            .with_columns(pl.lit(role).alias("role"))
+            .fill_null(0)
+        )
+    return re_delta, pl.concat(counts, how="diagonal")
+
+
+def add_to_accumulators(session: Session, season: int, plays: pl.DataFrame) -> None:
+    re_delta, count_delta = state_deltas(plays)
+    if re_delta.height:
+        stmt = sqlite_insert(RE24Accumulator).values(
+            [dict(season=season, **row) for row in re_delta.to_dicts()]
+        )
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["season", "base_state", "outs"],
+                set_={
+                    "runs_sum": RE24Accumulator.runs_sum + stmt.excluded.runs_sum,
+                    "count": RE24Accumulator.count + stmt.excluded.count,
+                },
+            )
+        )
+    rows = [dict(season=season, **row) for row in count_delta.to_dicts()]
+    for chunk in chunked(rows, len(PlayerStateCounts.__table__.columns)):
+        stmt = sqlite_insert(PlayerStateCounts).values(chunk)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["season", "role", "playerid", "state"],
+                set_={
+                    "starts": PlayerStateCounts.starts + stmt.excluded.starts,
+                    "ends": PlayerStateCounts.ends + stmt.excluded.ends,
+                    "runs": PlayerStateCounts.runs + stmt.excluded.runs,
+                },
+            )
+        )
+
+
+def re24_from_accumulators(session: Session, season: int) -> pl.DataFrame:
+    rows = session.execute(
+        select(
+            RE24Accumulator.base_state,
+            RE24Accumulator.outs,
+            RE24Accumulator.runs_sum,
+            RE24Accumulator.count,
+        ).where(RE24Accumulator.season == season)
+    ).all()
+    return (
+        pl.DataFrame(
+            rows,
+            schema={
+                "base_state": pl.Int64,
+                "outs": pl.Int64,
+                "runs_sum": pl.Int64,
+                "count": pl.Int64,
+            },
+            orient="row",
+        )
+        .with_columns(
+            (pl.col("runs_sum") / pl.col("count")).round(3).alias("expected_runs"),
+            pl.col("base_state")
+            .map_elements(decode_base_state, return_dtype=str)
+            .alias("base_state_description"),
+        )
+        .sort(["base_state", "outs"])
+    )
+
+
+def player_run_values(
+    session: Session, season: int, re: pl.DataFrame
+) -> dict[str, pl.DataFrame]:
+    """Recompute every player's run value for the season from their state counts"""
+    counts = pl.DataFrame(
+        session.execute(
+            select(
+                PlayerStateCounts.role,
+                PlayerStateCounts.playerid,
+                PlayerStateCounts.state,
+                PlayerStateCounts.starts,
+                PlayerStateCounts.ends,
+                PlayerStateCounts.runs,
+            ).where(PlayerStateCounts.season == season)
+        ).all(),
+        schema=["role", "playerid", "state", "starts", "ends", "runs"],
+        orient="row",
+    )
+    re_by_state = re.select(
+        (pl.col("base_state") * 3 + pl.col("outs")).alias("state"), "expected_runs"
+    )
+    players = pl.read_database(
+        "SELECT playerid, name FROM players", session.connection()
+    )
+    totals = (
+        counts.join(re_by_state, on="state", how="left")
+        .with_columns(pl.col("expected_runs").fill_null(0.0))
+        .group_by("role", "playerid")
+        .agg(
+            pl.col("starts").sum().alias("plate_appearances"),
+            (
+                pl.col("runs").sum()
+                + (pl.col("ends") * pl.col("expected_runs")).sum()
+                - (pl.col("starts") * pl.col("expected_runs")).sum()
+            )
+            .round(2)
+            .alias("total_run_value"),
+        )
+        .join(players, on="playerid")
+    )
+    return {role: totals.filter(pl.col("role") == role).drop("role") for role in ROLES}
+
+
+def replace_season_outputs(
+    session: Session, season: int, re: pl.DataFrame, run_values: dict[str, pl.DataFrame]
+) -> None:
+    session.execute(delete(YearlyRE24).where(YearlyRE24.year == season))
+    if re.height:
+        session.execute(
+            insert(YearlyRE24),
+            [
+                dict(
+                    year=season,
+                    base_state=row["base_state"],
+                    outs=row["outs"],
+                    expected_runs=row["expected_runs"],
+                    count=row["count"],
+                    base_state_description=row["base_state_description"],
+                )
+                for row in re.to_dicts()
+            ],
+        )
+    for role, model in ROLES.items():
+        session.execute(delete(model).where(model.year == season))
+        rows = [dict(year=season, **row) for row in run_values[role].to_dicts()]
+        if rows:
+            session.execute(insert(model), rows)
+
+
+def reset_season(session: Session, season: int) -> None:
+    for model in (RE24Accumulator, PlayerStateCounts, AggregatedGame):
+        session.execute(delete(model).where(model.season == season))
+
+
+def refresh_season(season: int, rebuild: bool = False) -> int:
+    """Fold the season's new games into its accumulators and rewrite its RE24 and
+    run-value rows. Returns the number of games added.
+
+    `rebuild` clears the accumulators first, for when already aggregated games
+    were re-ingested with different rows.
+    """
+    with session_scope() as session:
+        if rebuild:
+            reset_season(session, season)
+        gameids = pending_games(session, season)
+        if not gameids and not rebuild:
+            return 0
+        if gameids:
+            plays = load_plays_from_db(
+                f"{season_where(season)} AND p.gameid IN ({', '.join(map(str, gameids))})"
+            )
+            add_to_accumulators(session, season, plays)
+            session.execute(
+                insert(AggregatedGame), [dict(gameid=g, season=season) for g in gameids]
+            )
+        re = re24_from_accumulators(session, season)
+        # Stored leaderboards are about to change, so move the version their ETags hang off
+        bump_seasons(session, [season])
+        replace_season_outputs(
+            session, season, re, player_run_values(session, season, re)
+        )
+    return len(gameids)
+
+
+def refresh_pending_seasons() -> dict[int, int]:
+    """Refresh every season with new games, e.g. after ingestion. Returns the number
+    of games added per season."""
+    return {season: refresh_season(season) for season in pending_seasons()}
@@ -0,0 +1,151 @@
+"""Markov-chain run expectancy over the 24 base-out states
+
+Every plate appearance is a transition from state `base_state_before * 3 +
+previous_outs` to `base_state_after * 3 + outs`, or to the absorbing state 24
+once the third out is made, and carries the runs scored on it. With Q the 24x24
+transient part of the transition matrix and r the mean runs scored leaving each
+state, the expected runs to the end of the inning E solve
+
+    (I - Q) E = r
+
+Averaging runs_after per state only uses the innings that passed through that
+state. Here every state also borrows from the states it leads to, so rare states
+and short date ranges stay stable. Transition counts are cached per season and
+batting team. Any slice of seasons or teams is then a sum of those counts plus
+one batched np.linalg.solve.
+"""
+
+import numpy as np
+import polars as pl
+
+from backend.constants import decode_base_state
+from ..cache import frame_cache
+from ..metrics import timed
+from .plays import BATTING_TEAM, available_seasons, load_plays_from_db, scan_year
+
+STATES = 24
+# Column index of the absorbing three-out state in the 24x25 matrix
+END = 24
+
+FROM_STATE = pl.col("base_state_before") * 3 + pl.col("previous_outs")
+TO_STATE = (
+    pl.when(pl.col("outs") >= 3)
+    .then(END)
+    .otherwise(pl.col("base_state_after") * 3 + pl.col("outs"))
+)
+
+
+def transition_counts(
+    plays: pl.DataFrame | pl.LazyFrame, by: list[str] | None = None
+) -> pl.DataFrame:
+    """Number of transitions and runs scored on them per (from_state, to_state)"""
+    return (
+        plays.lazy()
+        .group_by(
+            *(by or []), FROM_STATE.alias("from_state"), TO_STATE.alias("to_state")
+        )
+        .agg(pl.len().alias("count"), pl.col("runs_scored").sum().alias("runs"))
+        .collect()
+    )
+
+
+def counts_by_team(plays: pl.DataFrame | pl.LazyFrame, season: int) -> pl.DataFrame:
+    return transition_counts(
+        plays.lazy().with_columns(BATTING_TEAM.alias("team")), ["team"]
+    ).with_columns(pl.lit(season, dtype=pl.Int64).alias("season"))
+
+
+@frame_cache.cached(season_arg="year")
+def season_transition_counts(year: int) -> pl.DataFrame:
+    """The season's transition counts by batting team, the grain every slice sums from"""
+    return counts_by_team(scan_year(year), year)
+
+
+def transition_arrays(
+    counts: pl.DataFrame, by: list[str] | None = None
+) -> tuple[pl.DataFrame, np.ndarray, np.ndarray]:
+    """Stack counts into one (k, 24, 25) transition-count array and a (k, 24) array
+    of runs scored leaving each state, one slice per distinct value of `by`"""
+    by = by or []
+    if by:
+        keys = counts.select(by).unique().sort(by)
+        counts = counts.join(keys.with_row_index("group"), on=by)
+    else:
+        keys = pl.DataFrame()
+        counts = counts.with_columns(pl.lit(0, dtype=pl.UInt32).alias("group"))
+    k = max(keys.height, 1)
+    group = counts["group"].to_numpy()
+    from_state = counts["from_state"].to_numpy()
+    transitions = np.zeros((k, STATES, STATES + 1))
+    runs = np.zeros((k, STATES))
+    np.add.at(
+        transitions,
+        (group, from_state, counts["to_state"].to_numpy()),
+        counts["count"].to_numpy(),
+    )
+    np.add.at(runs, (group, from_state), counts["runs"].to_numpy())
+    return keys, transitions, runs
+
+
+@timed("re_compute")
+def solve_run_expectancy(transitions: np.ndarray, runs: np.ndarray) -> np.ndarray:
+    """Expected runs to the end of the inning from each of the 24 states, batched
+    over the leading axis. States never observed in a slice come back as NaN."""
+    visits = transitions.sum(axis=2)
+    observed = visits > 0
+    probabilities = np.divide(
+        transitions,
+        visits[..., None],
+        out=np.zeros_like(transitions),
+        where=observed[..., None],
+    )
+    mean_runs = np.divide(runs, visits, out=np.zeros_like(runs), where=observed)
+    system = np.eye(STATES) - probabilities[..., :STATES]
+    try:
+        expected = np.linalg.solve(system, mean_runs[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        # A tiny slice can trap a state in a self-loop (e.g. one bases-loaded walk)
+        expected = (np.linalg.pinv(system) @ mean_runs[..., None])[..., 0]
+    return np.where(observed, expected, np.nan)
+
+
+def markov_re24(
+    seasons: list[int] | None = None, by: list[str] | None = None
+) -> pl.DataFrame:
+    """Markov RE24 over `seasons` (default: all), one table per distinct value of
+    `by` ("season" and/or "team"), shaped like compute_re24's output: the observed
+    states only, with the same dtypes"""
+    by = by or []
+    seasons = available_seasons() if seasons is None else seasons
+    frames = [season_transition_counts(season) for season in seasons]
+    if not frames:
+        frames = [counts_by_team(load_plays_from_db("0"), 0)]
+    keys, transitions, runs = transition_arrays(pl.concat(frames), by)
+    expected = solve_run_expectancy(transitions, runs)
+    k = expected.shape[0]
+    states = pl.DataFrame(
+        {
+            "group": np.repeat(np.arange(k, dtype=np.uint32), STATES),
+            "state": np.tile(np.arange(STATES), k),
+            "expected_runs": expected.ravel(),
+            "count": transitions.sum(axis=2).ravel().astype(np.int64),
+        }
+    ).with_columns(pl.col("expected_runs").fill_nan(None))
+    if by:
+        states = keys.with_row_index("group").join(states, on="group")
+    return (
+        states.filter(pl.col("count") > 0)
+        .select(
+            *by,
+            (pl.col("state") // 3).cast(pl.UInt8).alias("base_state_before"),
+            (pl.col("state") % 3).cast(pl.UInt8).alias("previous_outs"),
+            pl.col("expected_runs").round(3),
+            pl.col("count").cast(pl.UInt32),
+        )
+        .with_columns(
+            pl.col("base_state_before")
+            .map_elements(decode_base_state, return_dtype=str)
+            .alias("base_state_description")
+        )
+        .sort([*by, "base_state_before", "previous_outs"])
+    )
@@ -0,0 +1,289 @@
+"""Season play frames: the joined SQLite query and its Parquet snapshots
+
+A snapshot is the season's joined, sorted play frame written to
+`<SNAPSHOT_DIR>/season=<year>/plays-v<FRAME_FORMAT>.parquet`. The manifest
+records the SeasonVersion each snapshot was built from, so only seasons whose
+games changed are rebuilt, and a stale snapshot is never read.
+
+Frames use the narrowest types that hold each column: small counters and base
+states are UInt8/Int8, ids Int32, the result Categorical and the game date a
+Date. That keeps a cached season several times smaller than plain Int64 and
+String columns.
+"""
+
+import json
+import os
+from datetime import date
+from pathlib import Path
+
+import polars as pl
+from sqlalchemy import Engine, text
+
+from backend.constants import REGULAR_SEASON, SNAPSHOT_DIR
+from ..cache import frame_cache, read_season_versions
+from ..db import get_read_engine
+from ..metrics import count, timer
+from ..storage import uses_compact_plays
+
+# Bumped whenever the frame's columns or types change, so old snapshots are not read
+FRAME_FORMAT = 2
+
+# Before pl.Categories, categoricals from different frames (e.g. two seasons'
+# snapshots) only share an encoding under the global string cache
+if not hasattr(pl, "Categories"):
+    pl.enable_string_cache()
+
+
+def plays_query(where: str, compact: bool = False) -> str:
+    """The season query over PlayByPlay, or over CompactPlay with the result decoded"""
+    if compact:
+        source = "CompactPlay p JOIN EventCode e ON e.code = p.event_code"
+        result = "e.result"
+    else:
+        source = "PlayByPlay p"
+        result = "p.result"
+    return f"""
+        SELECT
+            p.gameid, p.inning, p.inning_half, p.outs, p.batter, p.pitcher, p.runs_scored, p.runs_scored_before, {result} as result, p.base_state_before, i.runs_scored as runs_scored_final, g.game_date, p.ab_index, p.base_state_after, g.home_team_id, g.away_team_id
+        FROM
+            {source}
+        JOIN
+            InningsFinal i
+        ON
+            p.gameid = i.gameid and
+            p.inning = i.inning and
+            p.inning_half = i.inning_half
+        JOIN
+            games g
+        ON
+            g.gameid = p.gameid
+        WHERE {where}
+        """
+
+
+# Column types of the season query as read, applied explicitly so empty results
+# keep their schema
+PLAY_SCHEMA = {
+    "gameid": pl.Int64,
+    "inning": pl.Int64,
+    "inning_half": pl.String,
+    "outs": pl.Int64,
+    "batter": pl.Int64,
+    "pitcher": pl.Int64,
+    "runs_scored": pl.Int64,
+    "runs_scored_before": pl.Int64,
+    "result": pl.String,
+    "base_state_before": pl.Int64,
+    "runs_scored_final": pl.Int64,
+    "game_date": pl.String,
+    "ab_index": pl.Int64,
+    "base_state_after": pl.Int64,
+    "home_team_id": pl.Int64,
+    "away_team_id": pl.Int64,
+}
+
+# Compact in-memory types of the season frame; the derived columns are cast too
+INNING_HALF = pl.Enum(["bottom", "top"])  # physical order matches the string order
+FRAME_SCHEMA = {
+    "gameid": pl.Int32,
+    "inning": pl.UInt8,
+    "inning_half": INNING_HALF,
+    "outs": pl.UInt8,
+    "batter": pl.Int32,
+    "pitcher": pl.Int32,
+    "runs_scored": pl.Int8,
+    "runs_scored_before": pl.Int8,
+    "result": pl.Categorical,
+    "base_state_before": pl.UInt8,
+    "runs_scored_final": pl.Int8,
+    "game_date": pl.Date,
+    "ab_index": pl.UInt16,
+    "base_state_after": pl.UInt8,
+    "home_team_id": pl.Int32,
+    "away_team_id": pl.Int32,
+    "runs_after": pl.Int8,
+    "previous_outs": pl.UInt8,
+}
+
+
+# The away team bats in the top of the inning and fields in the bottom
+BATTING_TEAM = (
+    pl.when(pl.col("inning_half") == "top")
+    .then(pl.col("away_team_id"))
+    .otherwise(pl.col("home_team_id"))
+)
+FIELDING_TEAM = (
+    pl.when(pl.col("inning_half") == "top")
+    .then(pl.col("home_team_id"))
+    .otherwise(pl.col("away_team_id"))
+)
+
+
+def season_where(year: int, game_types: tuple[str, ...] = REGULAR_SEASON) -> str:
+    """WHERE clause for the games of a season, regular season only by default"""
+    types = ", ".join(f"'{game_type}'" for game_type in game_types)
+    return f"g.season = {year} AND g.game_type IN ({types})"
+
+
+def year_query(year: int) -> str:
+    return plays_query(season_where(year))
+
+
+def load_plays_from_db(where: str, bind: Engine | None = None) -> pl.DataFrame:
+    with timer("season_load"), (bind or get_read_engine()).connect() as connection:
+        df = pl.read_database(
+            plays_query(where, uses_compact_plays(connection)),
+            connection,
+            schema_overrides=PLAY_SCHEMA,
+        )
+    count("season_rows_loaded", df.height)
+    df = (
+        df.with_columns(
+            (pl.col("runs_scored_final") - pl.col("runs_scored_before")).alias("runs_after")
+        )
+        .sort(
+            ["gameid", "inning", "inning_half", "ab_index"],
+            descending=[False, False, True, False],
+        )
+        .with_columns(
+            [
+                pl.col("outs")
+                .shift(1)
+                .over(["gameid", "inning", "inning_half", "game_date"])
+                .alias("previous_outs")
+                .fill_null(0)
+            ]
+        )
+        .with_columns(pl.col("game_date").str.to_date("%Y-%m-%d"))
+        .cast(FRAME_SCHEMA)
+    )
+    return df
+
+
+def load_year_from_db(
+    year: int, game_types: tuple[str, ...] = REGULAR_SEASON
+) -> pl.DataFrame:
+    """A season's plays; pass e.g. GAME_TYPES or ("D", "L", "W") for postseason games"""
+    return load_plays_from_db(season_where(year, game_types))
+
+
+def snapshot_path(year: int) -> Path:
+    return Path(SNAPSHOT_DIR) / f"season={year}" / f"plays-v{FRAME_FORMAT}.parquet"
+
+
+def read_manifest() -> dict[int, int]:
+    path = Path(SNAPSHOT_DIR) / "manifest.json"
+    if not path.exists():
+        return {}
+    return {int(season): version for season, version in json.loads(path.read_text()).items()}
+
+
+def write_manifest(manifest: dict[int, int]) -> None:
+    path = Path(SNAPSHOT_DIR) / "manifest.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({str(k): v for k, v in sorted(manifest.items())}, indent=2))
+    os.replace(tmp, path)
+
+
+def fresh_snapshot(year: int) -> Path | None:
+    """The season's snapshot, if one exists and was built from the current season version"""
+    path = snapshot_path(year)
+    if not path.exists():
+        return None
+    if read_manifest().get(year) != read_season_versions().get(year, 0):
+        return None
+    return path
+
+
+@frame_cache.cached(season_arg="year")
+def get_year_query_db(year: int) -> pl.DataFrame:
+    path = fresh_snapshot(year)
+    if path is not None:
+        with timer("season_load"):
+            df = pl.read_parquet(path)
+        count("season_rows_loaded", df.height)
+        return df
+    return load_year_from_db(year)
+
+
+def scan_year(year: int) -> pl.LazyFrame:
+    """Lazily scan a season from its snapshot, or from the cached SQLite frame when the
+    snapshot is missing or stale"""
+    path = fresh_snapshot(year)
+    if path is not None:
+        return pl.scan_parquet(path)
+    return get_year_query_db(year).lazy()
+
+
+def available_seasons() -> list[int]:
+    with get_read_engine().connect() as connection:
+        rows = connection.execute(
+            text("SELECT DISTINCT season FROM games WHERE season IS NOT NULL")
+        )
+        return sorted(row[0] for row in rows)
+
+
+def scan_plays(
+    seasons: list[int] | None = None,
+    start: date | None = None,
+    end: date | None = None,
+) -> pl.LazyFrame:
+    """Lazily scan plays for any set of seasons and/or an inclusive game_date range.
+
+    Seasons default to those overlapping the date range, or every season when
+    there is no range. Fresh snapshots are scanned with the date predicate pushed
+    down into the Parquet reader; seasons without one are read from SQLite with
+    the predicate in the WHERE clause, so only the requested window is loaded.
+    """
+    if seasons is None:
+        seasons = available_seasons()
+        if start is not None:
+            seasons = [s for s in seasons if s >= start.year]
+        if end is not None:
+            seasons = [s for s in seasons if s <= end.year]
+    date_filter = pl.lit(True)
+    sql_filter = ""
+    if start is not None:
+        date_filter &= pl.col("game_date") >= start
+        sql_filter += f" AND g.game_date >= '{start.isoformat()}'"
+    if end is not None:
+        date_filter &= pl.col("game_date") <= end
+        sql_filter += f" AND g.game_date <= '{end.isoformat()}'"
+
+    frames = []
+    for year in seasons:
+        path = fresh_snapshot(year)
+        if path is not None:
+            frames.append(pl.scan_parquet(path).filter(date_filter))
+        elif not sql_filter:
+            frames.append(get_year_query_db(year).lazy())
+        else:
+            frames.append(load_plays_from_db(season_where(year) + sql_filter).lazy())
+    if not frames:
+        return load_plays_from_db("0").lazy()
+    return pl.concat(frames, how="vertical_relaxed")
+
+
+def materialize_seasons(seasons: list[int] | None = None, force: bool = False) -> list[int]:
+    """Write snapshots for `seasons` (default: every season with play data) whose
+    games changed since the last build. Returns the seasons that were rebuilt."""
+    versions = read_season_versions()
+    manifest = read_manifest()
+    if seasons is None:
+        seasons = sorted(versions)
+    rebuilt = []
+    for year in seasons:
+        # Read the version before the data so a concurrent write only makes us rebuild again
+        version = versions.get(year, 0)
+        if not force and manifest.get(year) == version and snapshot_path(year).exists():
+            continue
+        path = snapshot_path(year)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        load_year_from_db(year).write_parquet(tmp, statistics=True)
+        os.replace(tmp, path)
+        manifest[year] = version
+        write_manifest(manifest)
+        rebuilt.append(year)
+    return rebuilt
@@ -1,70 +1,37 @@
 """Run Expectancy For The 24 Base-Out States"""
 
-from backend.constants import database, decode_base_state
-from sqlmodel import create_engine, select, Session
+from backend.constants import decode_base_state
+from sqlalchemy import delete, insert
+from sqlmodel import select, Session
 import polars as pl
-from functools import lru_cache
-from contextlib import contextmanager
-from ..models import BatterRunValue, PitcherRunValue, YearlyRE24
-conn = create_engine(database)
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import date
+from ..cache import frame_cache
+from ..db import get_read_engine, session_scope
+from ..metrics import timed
+from ..models import BatterRunValue, PitcherRunValue
+from .plays import (
+    BATTING_TEAM,
+    FIELDING_TEAM,
+    scan_plays,
+    scan_year,
+)
 
 
-@contextmanager
-def get_db_session():
-    session = Session(conn)
-    try:
-        yield session
-    finally:
-        session.close()
-
-@lru_cache
+@frame_cache.cached()
 def get_players():
-    return pl.read_database("SELECT * FROM players", conn.connect())
-
-@lru_cache
-def get_year_query_db(year:int):
-    query = f"""
-        SELECT
-            p.gameid, p.inning, p.inning_half, p.outs, p.batter, p.pitcher, p.runs_scored, p.runs_scored_before, p.result, p.base_state_before, i.runs_scored as runs_scored_final, g.game_date, p.ab_index, p.base_state_after
-        FROM
-            PlayByPlay p
-        JOIN
-            InningsFinal i
-        ON
-            p.gameid = i.gameid and
-            p.inning = i.inning and
-            p.inning_half = i.inning_half
-        JOIN
-            games g
-        ON
-            g.gameid = p.gameid
-        WHERE substring(g.game_date, 1, 4) = '{year}' 
-        """
-    df = pl.read_database(query, conn.connect()).unique()
-    df = (
-        df.with_columns(
-            (pl.col("runs_scored_final") - pl.col("runs_scored_before")).alias("runs_after")
-        )
-        .sort(
-            ["gameid", "inning", "inning_half", "ab_index"],
-            descending=[False, False, True, False],
-        )
-        .with_columns(
-            [
-                pl.col("outs")
-                .shift(1)
-                .over(["gameid", "inning", "inning_half", "game_date"])
-                .alias("previous_outs")
-                .fill_null(0)
-            ]
-        )
-    )
-    return df
-
+    with get_read_engine().connect() as connection:
+        return pl.read_database("SELECT * FROM players", connection)
 
-@lru_cache
+@frame_cache.cached(season_arg="year")
 def get_re24_specific_year(year:int):
-    df = get_year_query_db(year)
+    return compute_re24(scan_year(year))
+
+
+@timed("re_compute")
+def compute_re24(df: pl.LazyFrame) -> pl.DataFrame:
     # Add a column for runs scored from the AB to the end of the inning and then how many outs
     # there were before the AB
 
@@ -77,6 +44,7 @@ def get_re24_specific_year(year:int):
             ]
         )
         .sort(["base_state_before", "previous_outs"])
+        .collect()
     )
     re = re.with_columns(
         pl.col("base_state_before")
@@ -85,44 +53,59 @@ def get_re24_specific_year(year:int):
     )
     return re
 
-def calculate_batters_run_value(year:int, min_ab:int=50):
-    df = get_year_query_db(year)
-    players = get_players().select(['playerid', 'name'])
-    re_year = get_re24_specific_year(year)
-    re_lookup = {}
+def re_table(re_year: pl.DataFrame) -> pl.Series:
+    """RE24 as a flat 24-entry series indexed by base_state * 3 + outs"""
+    values = [None] * 24
     for row in re_year.iter_rows(named=True):
-        re_lookup[(row["base_state_before"], row["previous_outs"])] = row["expected_runs"]
-    # %%
-    # Back to df.  We want to add a column for the RE of each entry
-
-    df = df.with_columns(
-        pl.struct(pl.col("base_state_before"), pl.col("previous_outs"))
-        .map_elements(
-            lambda row: re_lookup[(row["base_state_before"], row["previous_outs"])],
-            return_dtype=float,
-        )
-        .alias("re_ab_start")
-    )
+        values[row["base_state_before"] * 3 + row["previous_outs"]] = row["expected_runs"]
+    return pl.Series("expected_runs", values, dtype=pl.Float64)
 
-    # Function to calculate RE afterwards
-    def re_after(row):
-        if row["outs"] == 3:
-            return 0
-        return re_lookup[(row["base_state_after"], row["outs"])]
 
-    df = df.with_columns(
-        pl.struct(pl.col("base_state_after"), pl.col("outs"))
-        .map_elements(re_after, return_dtype=float)
-        .alias("re_ab_end")
-    )
+def add_run_values(
+    df: pl.DataFrame | pl.LazyFrame, re_year: pl.DataFrame
+) -> pl.DataFrame | pl.LazyFrame:
+    """Add the RE at the start and end of each plate appearance and the run value added.
 
-    df = df.with_columns(
+    Both lookups are a single gather into the 24-entry RE table, and the inning
+    ending on the play (outs == 3) is worth 0 runs of expectancy afterwards.
+    """
+    table = pl.lit(re_table(re_year))
+    return df.with_columns(
+        table.gather(pl.col("base_state_before") * 3 + pl.col("previous_outs")).alias(
+            "re_ab_start"
+        ),
+        pl.when(pl.col("outs") == 3)
+        .then(0.0)
+        .otherwise(
+            table.gather(
+                pl.when(pl.col("outs") < 3).then(
+                    pl.col("base_state_after") * 3 + pl.col("outs")
+                )
+            )
+        )
+        .alias("re_ab_end"),
+    ).with_columns(
         (pl.col("runs_scored") + pl.col("re_ab_end") - pl.col("re_ab_start")).alias(
             "run_value_added"
         )
     )
-    player_stats = (
-        df.group_by("batter")
+
+
+@frame_cache.cached(season_arg="year")
+def get_annotated_year(year: int) -> pl.DataFrame:
+    """The season's plays with RE and run value added.
+
+    Every run-value aggregate for a season is built from this one frame, so the
+    annotation only runs once per season however many groupings are requested.
+    """
+    return add_run_values(scan_year(year), get_re24_specific_year(year)).collect()
+
+
+def aggregate_run_value(
+    df: pl.DataFrame | pl.LazyFrame, by: str
+) -> pl.DataFrame | pl.LazyFrame:
+    return (
+        df.group_by(by)
         .agg(
             [
                 pl.len().alias("plate_appearances"),
@@ -131,139 +114,176 @@ def calculate_batters_run_value(year:int, min_ab:int=50):
         )
         .sort("total_run_value", descending=True)
     )
-    player_stats = player_stats.join(players,
-                                     left_on='batter',
-                                     right_on='playerid').sort('total_run_value', descending=True)
-    # Insert into DB:
-    with get_db_session() as stats_session:
-        to_insert = player_stats.to_dicts()
-        for entry in to_insert:
-            stats_session.add(
-                BatterRunValue(
-                year = year,
-                    playerid = entry['batter'],
-                    plate_appearances=entry['plate_appearances'],
-                    total_run_value=entry['total_run_value'],
-                    name = entry['name']
-                )
-            )
-        stats_session.commit()
 
-    # Sample size
-    player_stats = player_stats.filter(pl.col("plate_appearances") >= min_ab)
-    return player_stats
 
-def get_batters_run_value(year:int, min_ab:int=50):
-    with get_db_session() as sesh:
-        years = sesh.exec(select(
-            BatterRunValue.year
-        ).distinct()
-        ).fetchall()
-
-    if year not in years:
-        return calculate_batters_run_value(year, min_ab)
-    else:
-        with get_db_session() as sesh:
-            data = sesh.exec(
-                select(
-                    BatterRunValue
-                ).where(
-                    BatterRunValue.year == year
-                ).where(
-                    BatterRunValue.plate_appearances >= min_ab
-                )
-            ).fetchall()
-        return pl.DataFrame([d.model_dump() for d in data])
+def batter_run_values(year: int) -> pl.DataFrame:
+    players = get_players().select(["playerid", "name"])
+    return (
+        aggregate_run_value(get_annotated_year(year), "batter")
+        .join(players, left_on="batter", right_on="playerid")
+        .sort("total_run_value", descending=True)
+    )
 
 
+def pitcher_run_values(year: int) -> pl.DataFrame:
+    players = get_players().select(["playerid", "name"])
+    return (
+        aggregate_run_value(get_annotated_year(year), "pitcher")
+        .join(players, left_on="pitcher", right_on="playerid")
+        .sort("total_run_value", descending=True)
+    )
 
 
-def calculate_pitchers_run_value(year:int, min_ab:int=50):
-    df = get_year_query_db(year)
-    players = get_players().select(['playerid', 'name'])
-    re_year = get_re24_specific_year(year)
-    re_lookup = {}
-    for row in re_year.iter_rows(named=True):
-        re_lookup[(row["base_state_before"], row["previous_outs"])] = row["expected_runs"]
-    # %%
-    # Back to df.  We want to add a column for the RE of each entry
-
-    df = df.with_columns(
-        pl.struct(pl.col("base_state_before"), pl.col("previous_outs"))
-        .map_elements(
-            lambda row: re_lookup[(row["base_state_before"], row["previous_outs"])],
-            return_dtype=float,
-        )
-        .alias("re_ab_start")
+def team_run_values(year: int) -> pl.DataFrame:
+    """Run value created at the plate and allowed in the field by each team"""
+    df = get_annotated_year(year).with_columns(
+        BATTING_TEAM.alias("batting_team"), FIELDING_TEAM.alias("fielding_team")
+    )
+    batting = aggregate_run_value(df, "batting_team").rename(
+        {"batting_team": "team_id", "total_run_value": "batting_run_value"}
+    )
+    fielding = aggregate_run_value(df, "fielding_team").select(
+        pl.col("fielding_team").alias("team_id"),
+        pl.col("total_run_value").alias("fielding_run_value"),
+    )
+    return batting.join(fielding, on="team_id", how="left").sort(
+        "batting_run_value", descending=True
     )
 
-    # Function to calculate RE afterwards
-    def re_after(row):
-        if row["outs"] == 3:
-            return 0
-        return re_lookup[(row["base_state_after"], row["outs"])]
 
-    df = df.with_columns(
-        pl.struct(pl.col("base_state_after"), pl.col("outs"))
-        .map_elements(re_after, return_dtype=float)
-        .alias("re_ab_end")
+def position_run_values(year: int) -> pl.DataFrame:
+    """Batting run value grouped by each batter's primary position that season"""
+    positions = get_players().select(
+        "playerid",
+        pl.col("years_positions").str.json_path_match(f"$['{year}']").alias("position"),
+    )
+    return aggregate_run_value(
+        get_annotated_year(year).join(positions, left_on="batter", right_on="playerid"),
+        "position",
     )
 
-    df = df.with_columns(
-        (pl.col("runs_scored") + pl.col("re_ab_end") - pl.col("re_ab_start")).alias(
-            "run_value_added"
-        )
+
+def re24_for_range(
+    seasons: list[int] | None = None, start: date | None = None, end: date | None = None
+) -> pl.DataFrame:
+    """RE24 pooled over any set of seasons and/or date range"""
+    return compute_re24(scan_plays(seasons, start, end))
+
+
+def run_values_for_range(
+    by: str,
+    seasons: list[int] | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    min_ab: int = 50,
+) -> pl.DataFrame:
+    """Run value per `by` ("batter" or "pitcher") over a season set and/or date range,
+    using the RE24 table of that same window"""
+    plays = scan_plays(seasons, start, end)
+    re_window = compute_re24(plays)
+    players = get_players().select(["playerid", "name"])
+    return (
+        aggregate_run_value(add_run_values(plays, re_window), by)
+        .filter(pl.col("plate_appearances") >= min_ab)
+        .collect()
+        .join(players, left_on=by, right_on="playerid")
+        .sort("total_run_value", descending=by == "batter")
     )
-    player_stats = (
-        df.group_by("pitcher")
-        .agg(
-            [
-                pl.len().alias("plate_appearances"),
-                pl.col("run_value_added").sum().round(2).alias("total_run_value"),
-            ]
+
+
+def calculate_batters_run_value(year:int, min_ab:int=50):
+    player_stats = batter_run_values(year)
+    # Replace rather than append, so a second computation of the season leaves no duplicates
+    rows = [
+        dict(
+            year=year,
+            playerid=entry["batter"],
+            plate_appearances=entry["plate_appearances"],
+            total_run_value=entry["total_run_value"],
+            name=entry["name"],
         )
-        .sort("total_run_value", descending=True)  # Minimum sample size
-    )
+        for entry in player_stats.to_dicts()
+    ]
+    with session_scope() as stats_session:
+        stats_session.execute(delete(BatterRunValue).where(BatterRunValue.year == year))
+        # An empty list would become a single all-NULL row; a season without plays has none
+        if rows:
+            stats_session.execute(insert(BatterRunValue), rows)
 
-    player_stats = player_stats.join(players,
-                                     left_on='pitcher',
-                                     right_on='playerid').sort('total_run_value', descending=True)
-    # Insert into DB:
-    with get_db_session() as stats_session:
-        to_insert = player_stats.to_dicts()
-        for entry in to_insert:
-            stats_session.add(
-                PitcherRunValue(
-                    year=year,
-                    playerid=entry["pitcher"],
-                    plate_appearances=entry["plate_appearances"],
-                    total_run_value=entry["total_run_value"],
-                    name=entry["name"],
-                )
+    # Sample size
+    player_stats = player_stats.filter(pl.col("plate_appearances") >= min_ab)
+    return player_stats
+
+def read_run_value_table(
+    model, year: int, min_ab: int = 50, session: Session | None = None
+) -> pl.DataFrame:
+    """Stored run-value leaderboard rows for a season, best first"""
+    with Session(get_read_engine()) if session is None else nullcontext(session) as sesh:
+        return pl.read_database(
+            select(
+                model.playerid,
+                model.name,
+                model.year,
+                model.plate_appearances,
+                model.total_run_value,
             )
-        stats_session.commit()
+            .where(model.year == year)
+            .where(model.plate_appearances >= min_ab)
+            # Pitchers are best when they allow the least run value
+            .order_by(
+                model.total_run_value.desc()
+                if model is BatterRunValue
+                else model.total_run_value
+            ),
+            sesh.connection(),
+        )
+
+
+def has_run_value_rows(model, year: int, session: Session | None = None) -> bool:
+    with Session(get_read_engine()) if session is None else nullcontext(session) as sesh:
+        return sesh.exec(select(model.id).where(model.year == year).limit(1)).first() is not None
+
+
+# One lock per (table, season), so requests differing only in min_ab fill a table once
+fill_locks: defaultdict[tuple, threading.Lock] = defaultdict(threading.Lock)
+
+
+def fill_run_value_table(model, year: int, calculate, session: Session | None = None):
+    if has_run_value_rows(model, year, session):
+        return
+    with fill_locks[model.__name__, year]:
+        # Another thread may have filled it while this one waited
+        if not has_run_value_rows(model, year):
+            calculate(year)
+
+
+def get_batters_run_value(year:int, min_ab:int=50, session: Session | None = None):
+    fill_run_value_table(BatterRunValue, year, calculate_batters_run_value, session)
+    return read_run_value_table(BatterRunValue, year, min_ab, session)
+
+
+def calculate_pitchers_run_value(year:int, min_ab:int=50):
+    player_stats = pitcher_run_values(year)
+    # Replace rather than append, so a second computation of the season leaves no duplicates
+    rows = [
+        dict(
+            year=year,
+            playerid=entry["pitcher"],
+            plate_appearances=entry["plate_appearances"],
+            total_run_value=entry["total_run_value"],
+            name=entry["name"],
+        )
+        for entry in player_stats.to_dicts()
+    ]
+    with session_scope() as stats_session:
+        stats_session.execute(delete(PitcherRunValue).where(PitcherRunValue.year == year))
+        # An empty list would become a single all-NULL row; a season without plays has none
+        if rows:
+            stats_session.execute(insert(PitcherRunValue), rows)
 
     player_stats = player_stats.filter(pl.col("plate_appearances") >= min_ab)
     return player_stats[::-1]
 
-def get_pitchers_run_value(year:int, min_ab:int=50):
-    with get_db_session() as sesh:
-        years = sesh.exec(select(
-            PitcherRunValue.year
-        ).distinct()
-        ).fetchall()
-
-    if year not in years:
-        return calculate_pitchers_run_value(year, min_ab)
-    else:
-        with get_db_session() as sesh:
-            data = sesh.exec(
-                select(
-                    PitcherRunValue
-                ).where(
-                    PitcherRunValue.year == year
-                ).where(
-                    PitcherRunValue.plate_appearances >= min_ab
-                )
-            ).fetchall()
-        return pl.DataFrame([d.model_dump() for d in data])
+def get_pitchers_run_value(year:int, min_ab:int=50, session: Session | None = None):
+    fill_run_value_table(PitcherRunValue, year, calculate_pitchers_run_value, session)
+    return read_run_value_table(PitcherRunValue, year, min_ab, session)
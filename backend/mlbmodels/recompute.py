@@ -0,0 +1,81 @@
+"""Full RE24 and run-value recomputation across many seasons at once
+
+Seasons are independent, so each one is computed in its own worker process,
+reading plays from its Parquet snapshot or through a read-only SQLite
+connection. The finished frames come back to the parent, which is the only
+writer: it replaces each season's YearlyRE24, BatterRunValue and
+PitcherRunValue rows in a single transaction as results arrive.
+"""
+
+from concurrent.futures import as_completed
+from pathlib import Path
+
+import polars as pl
+import tqdm
+
+from ..db import get_read_engine, session_scope
+from ..models import bump_seasons
+from ..processes import process_pool
+from .incremental import ROLES, replace_season_outputs
+from .plays import fresh_snapshot, load_plays_from_db, season_where
+from .re24 import add_run_values, aggregate_run_value, compute_re24
+
+
+def compute_season(
+    season: int, snapshot: Path | None
+) -> tuple[int, pl.DataFrame, dict[str, pl.DataFrame]]:
+    """RE24 table and per-player run values for one season; never writes"""
+    if snapshot is not None:
+        plays = pl.scan_parquet(snapshot)
+    else:
+        plays = load_plays_from_db(season_where(season)).lazy()
+    re = compute_re24(plays)
+    annotated = add_run_values(plays, re).collect()
+    run_values = {
+        role: aggregate_run_value(annotated, role).rename({role: "playerid"})
+        for role in ROLES
+    }
+    re = re.rename({"base_state_before": "base_state", "previous_outs": "outs"})
+    return season, re, run_values
+
+
+def write_season(
+    season: int,
+    re: pl.DataFrame,
+    run_values: dict[str, pl.DataFrame],
+    players: pl.DataFrame,
+) -> None:
+    with session_scope() as session:
+        replace_season_outputs(
+            session,
+            season,
+            re,
+            {role: df.join(players, on="playerid") for role, df in run_values.items()},
+        )
+        bump_seasons(session, [season])
+
+
+def recompute_seasons(seasons: list[int], workers: int = 1) -> list[int]:
+    """Recompute and store every season in `seasons`, `workers` seasons at a time.
+    Returns the seasons written, in completion order."""
+    # Decided up front so workers never need to read the manifest or versions themselves
+    snapshots = {season: fresh_snapshot(season) for season in seasons}
+    with get_read_engine().connect() as connection:
+        players = pl.read_database("SELECT playerid, name FROM players", connection)
+
+    written = []
+    if workers <= 1:
+        for season in tqdm.tqdm(seasons):
+            write_season(*compute_season(season, snapshots[season]), players)
+            written.append(season)
+        return written
+
+    with process_pool(workers) as pool:
+        futures = [
+            pool.submit(compute_season, season, snapshots[season]) for season in seasons
+        ]
+        for future in tqdm.tqdm(as_completed(futures), total=len(futures)):
+            season, re, run_values = future.result()
+            write_season(season, re, run_values, players)
+            written.append(season)
+    return written
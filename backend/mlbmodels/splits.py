@@ -0,0 +1,111 @@
+"""Split run values from a precomputed per-season aggregate cube
+
+The cube holds plate appearances and summed run value per (role, player,
+opponent, home, month, base_state, outs), built from the season's annotated
+play frame in one group-by over both roles. Any split or roll-up is then a
+filter and a group-by over the cube, never a rescan or re-annotation of plays.
+
+Columns use the narrowest integer types that fit, and the cube is sorted by
+role and player so slices for one player are contiguous. It is written to
+`<SNAPSHOT_DIR>/season=<year>/splits-v<version>.parquet`, so a cube built from
+an older season version is never read.
+"""
+
+from pathlib import Path
+import polars as pl
+
+from backend.constants import SNAPSHOT_DIR, SplitKey
+from ..cache import frame_cache, read_season_versions
+from ..fileio import replace_atomically
+from .plays import BATTING_TEAM, FIELDING_TEAM
+from .re24 import get_annotated_year, get_players
+
+ROLES = ("batter", "pitcher")
+ROLE = pl.Enum(ROLES)
+DIMENSIONS = ("opponent", "home", "month", "base_state", "outs")
+
+
+def role_view(plays: pl.LazyFrame, role: str) -> pl.LazyFrame:
+    """One row per plate appearance from `role`'s side: the other team is the
+    opponent, and home means the player's team is the home team"""
+    batting = role == "batter"
+    return plays.select(
+        pl.lit(role, dtype=ROLE).alias("role"),
+        pl.col(role).cast(pl.Int32).alias("playerid"),
+        (FIELDING_TEAM if batting else BATTING_TEAM).cast(pl.Int16).alias("opponent"),
+        (pl.col("inning_half") == ("bottom" if batting else "top")).alias("home"),
+        pl.col("game_date").dt.month().cast(pl.Int8).alias("month"),
+        pl.col("base_state_before").cast(pl.Int8).alias("base_state"),
+        pl.col("previous_outs").cast(pl.Int8).alias("outs"),
+        "run_value_added",
+    )
+
+
+def build_cube(annotated: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+    return (
+        pl.concat([role_view(annotated.lazy(), role) for role in ROLES])
+        .group_by("role", "playerid", *DIMENSIONS)
+        .agg(
+            pl.len().cast(pl.UInt32).alias("plate_appearances"),
+            pl.col("run_value_added").sum().alias("run_value"),
+        )
+        .sort("role", "playerid", *DIMENSIONS)
+        .collect()
+    )
+
+
+def cube_path(year: int, version: int) -> Path:
+    return Path(SNAPSHOT_DIR) / f"season={year}" / f"splits-v{version}.parquet"
+
+
+@frame_cache.cached(season_arg="year")
+def get_split_cube(year: int) -> pl.DataFrame:
+    """The season's cube, from disk when it was built from the current season version"""
+    path = cube_path(year, read_season_versions().get(year, 0))
+    if path.exists():
+        # One open handle: reading by path may reopen it after a concurrent replace
+        with path.open("rb") as f:
+            return pl.read_parquet(f)
+    cube = build_cube(get_annotated_year(year))
+    if cube.is_empty():
+        # Nothing to keep for a season without plays
+        return cube
+    # Concurrent requests may rebuild the same season; each writes its own temp file
+    with replace_atomically(path) as tmp:
+        cube.write_parquet(tmp, statistics=True)
+    for stale in path.parent.glob("splits-v*.parquet"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return cube
+
+
+def split_run_values(
+    year: int,
+    role: str = "batter",
+    by: list[SplitKey] | None = None,
+    filters: dict[str, int | bool | None] | None = None,
+    min_pa: int = 0,
+) -> pl.DataFrame:
+    """Run value for `role` grouped by `by` (default: per player), over the cube
+    cells matching every non-None value in `filters`, e.g. {"home": False,
+    "month": 7}. Leaving "playerid" out of `by` rolls up across players."""
+    by = list(by or ["playerid"])
+    cube = get_split_cube(year).filter(pl.col("role") == role)
+    for dimension, value in (filters or {}).items():
+        if value is not None:
+            cube = cube.filter(pl.col(dimension) == value)
+    result = (
+        cube.group_by(by)
+        .agg(
+            pl.col("plate_appearances").sum(),
+            pl.col("run_value").sum().round(2).alias("total_run_value"),
+        )
+        .filter(pl.col("plate_appearances") >= min_pa)
+    )
+    if "playerid" in by:
+        players = get_players().select(pl.col("playerid").cast(pl.Int32), "name")
+        result = result.join(players, on="playerid", how="left")
+    # Pitchers are best when they allow the least run value
+    return result.sort(
+        ["total_run_value", *by], descending=[role == "batter"] + [False] * len(by)
+    )
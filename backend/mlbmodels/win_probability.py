@@ -0,0 +1,282 @@
+"""Win probability and leverage index from a precomputed state grid
+
+The grid holds the home team's win probability and the leverage index for every
+(inning, half, outs, base_state, score_diff) cell, where score_diff is home
+runs minus away runs at the start of the plate appearance. It is built from two
+run distributions:
+
+- how many runs a half-inning produces, from InningsFinal
+- how many more runs score from each base-out state to the end of the half, from
+  the plays' runs_after
+
+A backward recursion over half-innings gives the win probability at the start of
+each half. The in-inning cells then mix those values over the runs still to
+come. The ninth inning stands for every later inning too: a tie after the ninth
+restarts the same recursion, solved in closed form. Leverage is the expected
+absolute win-probability swing of the next plate appearance, over the observed
+base-out transitions, divided by its average over all plate appearances.
+
+The arrays are saved to `<SNAPSHOT_DIR>/win_probability.npz` along with the
+season versions they were built from, and rebuilt when any season changes.
+Annotating a frame is then a single gather per column.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from backend.constants import SNAPSHOT_DIR
+
+from ..cache import frame_cache, read_season_versions
+from ..fileio import replace_atomically
+from .plays import scan_plays, scan_year
+
+INNINGS = 9
+HALVES = ("top", "bottom")
+OUTS = 3
+BASE_STATES = 8
+MAX_DIFF = 12
+MAX_RUNS = 10
+DIFFS = np.arange(-MAX_DIFF, MAX_DIFF + 1)
+SHAPE = (INNINGS, len(HALVES), OUTS, BASE_STATES, len(DIFFS))
+
+# Row-major index of a play's cell in the flattened grid, in Int64 since the
+# frame's UInt8 columns would overflow
+CELL = (
+    (
+        (
+            (pl.min_horizontal(pl.col("inning").cast(pl.Int64), INNINGS) - 1)
+            * len(HALVES)
+            + (pl.col("inning_half") == "bottom").cast(pl.Int64)
+        )
+        * OUTS
+        + pl.col("previous_outs")
+    )
+    * BASE_STATES
+    + pl.col("base_state_before")
+) * len(DIFFS) + (
+    pl.col("score_diff").cast(pl.Int64).clip(-MAX_DIFF, MAX_DIFF) + MAX_DIFF
+)
+
+
+def grid_path() -> Path:
+    return Path(SNAPSHOT_DIR) / "win_probability.npz"
+
+
+@dataclass
+class WinProbabilityGrid:
+    win_probability: np.ndarray
+    leverage_index: np.ndarray
+    versions: dict[int, int]
+
+    def save(self, path: Path) -> None:
+        seasons = np.array(sorted(self.versions), dtype=np.int64)
+        # Through a file object, since savez appends ".npz" to a bare path
+        with replace_atomically(path) as tmp, tmp.open("wb") as f:
+            np.savez_compressed(
+                f,
+                win_probability=self.win_probability.astype(np.float32),
+                leverage_index=self.leverage_index.astype(np.float32),
+                seasons=seasons,
+                versions=np.array([self.versions[s] for s in seasons], dtype=np.int64),
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "WinProbabilityGrid":
+        with np.load(path) as data:
+            return cls(
+                data["win_probability"],
+                data["leverage_index"],
+                dict(zip(data["seasons"].tolist(), data["versions"].tolist())),
+            )
+
+    def lookup(
+        self, inning: int, half: str, outs: int, base_state: int, score_diff: int
+    ) -> dict:
+        cell = (
+            min(inning, INNINGS) - 1,
+            HALVES.index(half),
+            outs,
+            base_state,
+            int(np.clip(score_diff, -MAX_DIFF, MAX_DIFF)) + MAX_DIFF,
+        )
+        return {
+            "home_win_probability": round(float(self.win_probability[cell]), 4),
+            "leverage_index": round(float(self.leverage_index[cell]), 3),
+        }
+
+    def frame(self) -> pl.DataFrame:
+        """The grid as one row per cell"""
+        inning, half, outs, base_state, diff = np.indices(SHAPE)
+        return pl.DataFrame(
+            {
+                "inning": inning.ravel() + 1,
+                "inning_half": np.array(HALVES)[half.ravel()],
+                "outs": outs.ravel(),
+                "base_state": base_state.ravel(),
+                "score_diff": DIFFS[diff.ravel()],
+                "home_win_probability": self.win_probability.ravel(),
+                "leverage_index": self.leverage_index.ravel(),
+            }
+        ).with_columns(
+            pl.col("home_win_probability").cast(pl.Float64).round(4),
+            pl.col("leverage_index").cast(pl.Float64).round(3),
+        )
+
+
+def add_score_state(df: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame | pl.LazyFrame:
+    """Add score_diff, home minus away runs when each plate appearance starts.
+
+    Runs before the half-inning come from the earlier halves' InningsFinal totals,
+    and runs_scored_before covers the half-inning so far.
+    """
+    top = pl.col("inning_half") == "top"
+    halves = (
+        df.select("gameid", "inning", "inning_half", "runs_scored_final")
+        .unique()
+        .sort(["gameid", "inning", "inning_half"], descending=[False, False, True])
+        .with_columns(
+            pl.when(top).then(pl.col("runs_scored_final")).otherwise(0).alias("away"),
+            pl.when(top).then(0).otherwise(pl.col("runs_scored_final")).alias("home"),
+        )
+        .select(
+            "gameid",
+            "inning",
+            "inning_half",
+            (
+                (pl.col("home").cum_sum() - pl.col("home"))
+                - (pl.col("away").cum_sum() - pl.col("away"))
+            )
+            .over("gameid")
+            .alias("half_start_diff"),
+        )
+    )
+    return (
+        df.join(halves, on=["gameid", "inning", "inning_half"], how="left")
+        .with_columns(
+            (
+                pl.col("half_start_diff")
+                + pl.when(top)
+                .then(-pl.col("runs_scored_before"))
+                .otherwise(pl.col("runs_scored_before"))
+            ).alias("score_diff")
+        )
+        .drop("half_start_diff")
+    )
+
+
+def run_distribution(runs: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """P(runs = n) per group, with everything above MAX_RUNS lumped into MAX_RUNS"""
+    counts = np.zeros((n_groups, MAX_RUNS + 1))
+    np.add.at(counts, (groups, np.clip(runs, 0, MAX_RUNS)), 1)
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+
+def shifted(values: np.ndarray, sign: int) -> np.ndarray:
+    """values[..., d + sign * n] for every n in 0..MAX_RUNS, clipped to the diff range"""
+    index = np.clip(
+        np.arange(len(DIFFS))[None, :] + sign * np.arange(MAX_RUNS + 1)[:, None],
+        0,
+        len(DIFFS) - 1,
+    )
+    return values[..., index]
+
+
+def build_grid(plays: pl.DataFrame, versions: dict[int, int]) -> WinProbabilityGrid:
+    state = (plays["base_state_before"] * 3 + plays["previous_outs"]).to_numpy()
+    halves = plays.select(
+        "gameid", "inning", "inning_half", "runs_scored_final"
+    ).unique()
+    inning_runs = run_distribution(
+        halves["runs_scored_final"].to_numpy(), np.zeros(halves.height, dtype=int), 1
+    )[0]
+    runs_to_go = run_distribution(plays["runs_after"].to_numpy(), state, 24)
+
+    # Chance of the home team winning from a tie after nine, each extra inning
+    # being two half-innings drawn from the same run distribution
+    more = 1 - np.cumsum(inning_runs)
+    tie = (inning_runs @ more) / (1 - inning_runs @ inning_runs)
+
+    # after[i, h] is the win probability by score diff once half h of inning i ends
+    after = np.zeros((INNINGS, len(HALVES), len(DIFFS)))
+    after[-1, 1] = np.where(DIFFS > 0, 1.0, np.where(DIFFS < 0, 0.0, tie))
+    for inning in reversed(range(INNINGS)):
+        if inning < INNINGS - 1:
+            # The end of the bottom half is the start of the next top half
+            after[inning, 1] = inning_runs @ shifted(after[inning + 1, 0], -1)
+        after[inning, 0] = inning_runs @ shifted(after[inning, 1], 1)
+
+    # Next base-out state and runs scored of each plate appearance, per starting state
+    to_state = np.where(
+        plays["outs"].to_numpy() >= 3,
+        24,
+        (plays["base_state_after"] * 3 + plays["outs"]).to_numpy(),
+    )
+    runs_scored = np.clip(plays["runs_scored"].to_numpy(), 0, MAX_RUNS)
+    transitions = np.zeros((24, 25, MAX_RUNS + 1))
+    np.add.at(transitions, (state, to_state, runs_scored), 1)
+    visits = transitions.sum(axis=(1, 2), keepdims=True)
+    transitions = np.divide(
+        transitions, visits, out=np.zeros_like(transitions), where=visits > 0
+    )
+
+    win_probability = np.zeros((INNINGS, len(HALVES), 24, len(DIFFS)))
+    swing = np.zeros_like(win_probability)
+    # The home team bats in the bottom half, so its runs move the diff up
+    for inning in range(INNINGS):
+        for half, sign in ((0, -1), (1, 1)):
+            end = shifted(after[inning, half], sign)
+            wp = runs_to_go @ end
+            # Win probability after the next plate appearance by (to_state, runs, diff)
+            following = np.concatenate([shifted(wp, sign), end[None]])
+            swing[inning, half] = np.einsum(
+                "str,strd->sd",
+                transitions,
+                np.abs(following[None] - wp[:, None, None, :]),
+            )
+            win_probability[inning, half] = wp
+
+    # States are indexed base_state * 3 + outs; the grid keeps outs before base_state
+    win_probability = win_probability.reshape(SHAPE[:2] + (8, 3, -1)).swapaxes(2, 3)
+    swing = swing.reshape(SHAPE[:2] + (8, 3, -1)).swapaxes(2, 3)
+
+    # Normalise leverage so the average plate appearance scores 1
+    cells = add_score_state(plays).select(CELL)[:, 0].to_numpy()
+    mean_swing = swing.ravel()[cells].mean() if len(cells) else 1.0
+    return WinProbabilityGrid(win_probability, swing / mean_swing, versions)
+
+
+@frame_cache.cached()
+def get_win_probability_grid() -> WinProbabilityGrid:
+    """The grid over every season, from disk when it was built from the current data"""
+    versions = read_season_versions()
+    path = grid_path()
+    if path.exists():
+        grid = WinProbabilityGrid.load(path)
+        if grid.versions == versions:
+            return grid
+    grid = build_grid(scan_plays().collect(), versions)
+    grid.save(path)
+    return grid
+
+
+def add_win_probability(
+    df: pl.DataFrame | pl.LazyFrame, grid: WinProbabilityGrid | None = None
+) -> pl.DataFrame | pl.LazyFrame:
+    """Add score_diff and the home win probability and leverage index at the start of
+    each plate appearance"""
+    grid = grid or get_win_probability_grid()
+    wp = pl.lit(pl.Series(grid.win_probability.ravel(), dtype=pl.Float64))
+    li = pl.lit(pl.Series(grid.leverage_index.ravel(), dtype=pl.Float64))
+    return add_score_state(df).with_columns(
+        wp.gather(CELL).round(4).alias("home_win_probability"),
+        li.gather(CELL).round(3).alias("leverage_index"),
+    )
+
+
+@frame_cache.cached(season_arg="year")
+def get_win_probability_year(year: int) -> pl.DataFrame:
+    return add_win_probability(scan_year(year)).collect()
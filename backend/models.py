@@ -1,35 +1,40 @@
-import httpx
-from sqlmodel import Field, Session, SQLModel, create_engine, JSON
-from backend.constants import database
+from sqlalchemy import bindparam, text
+from sqlmodel import Field, Index, Session, SQLModel, JSON
+from backend.db import get_engine
 from typing import Any
 
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type,
-)
-
-engine = create_engine(database)
-
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
-
-
-session = Session(engine)
-
-
-@retry(
-    stop=stop_after_attempt(3),
-    reraise=True,
-    retry=retry_if_exception_type((httpx.ConnectError, httpx.TimeoutException)),
-    wait=wait_exponential(multiplier=3, min=1, max=30),
-)
-def get_response(url: str, client):
-    with client as c:
-        response = c.get(url, timeout=5)
-        return response
+    SQLModel.metadata.create_all(get_engine())
+
+
+def bump_season_versions(session: Session, gameids: list[int]) -> None:
+    """Mark the seasons of `gameids` as changed so cached frames for them are dropped.
+
+    Runs inside the caller's transaction, so the bump commits with the rows it describes.
+    """
+    if not gameids:
+        return
+    session.execute(
+        text(
+            "INSERT INTO seasonversion (season, version) "
+            "SELECT DISTINCT season, 1 FROM games "
+            "WHERE season IS NOT NULL AND gameid IN :gameids "
+            "ON CONFLICT(season) DO UPDATE SET version = version + 1"
+        ).bindparams(bindparam("gameids", expanding=True)),
+        {"gameids": list(set(gameids))},
+    )
+
+
+def bump_seasons(session: Session, seasons: list[int]) -> None:
+    for season in set(seasons):
+        session.execute(
+            text(
+                "INSERT INTO seasonversion (season, version) VALUES (:season, 1) "
+                "ON CONFLICT(season) DO UPDATE SET version = version + 1"
+            ),
+            {"season": season},
+        )
 
 
 def encode_base_state(
@@ -39,16 +44,25 @@ def encode_base_state(
 
 
 class Games(SQLModel, table=True):
+    # (season, gameid) lets the season filter in the RE24 query resolve from the index alone
+    __table_args__ = (Index("ix_games_season_gameid", "season", "gameid"),)
     id: int | None = Field(default=None, primary_key=True)
-    gameid: int
+    # Unique so the schedule loader can upsert on it and the play joins stay 1:1
+    gameid: int = Field(index=True, unique=True)
     gameguid: str
     game_date: str
     away_team_id: int
     home_team_id: int
     game_type: str
+    season: int | None = None
+    # detailedState from the schedule, e.g. "Final", "Completed Early", "Postponed"
+    status: str | None = None
 
 
 class InningsFinal(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_inningsfinal_game_inning", "gameid", "inning", "inning_half"),
+    )
     id: int | None = Field(default=None, primary_key=True)
     gameid: int
     inning: int
@@ -57,6 +71,9 @@ class InningsFinal(SQLModel, table=True):
 
 
 class PlayByPlay(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_playbyplay_game_inning", "gameid", "inning", "inning_half"),
+    )
     id: int | None = Field(default=None, primary_key=True)
     gameid: int
     inning: int
@@ -83,9 +100,40 @@ class PlayByPlay(SQLModel, table=True):
     ab_index: int
 
 
+class EventCode(SQLModel, table=True):
+    """Lookup table for CompactPlay.event_code"""
+    code: int | None = Field(default=None, primary_key=True)
+    result: str = Field(unique=True)
+
+
+class CompactPlay(SQLModel, table=True):
+    """PlayByPlay in the compact storage format (see backend/storage.py).
+
+    The result is an EventCode, the runner booleans are dropped since the base
+    states encode them, and play_end_time is epoch milliseconds.
+    """
+    __table_args__ = (
+        Index("ix_compactplay_game_inning", "gameid", "inning", "inning_half"),
+    )
+    id: int | None = Field(default=None, primary_key=True)
+    gameid: int
+    inning: int
+    inning_half: str
+    batter: int
+    pitcher: int
+    outs: int
+    runs_scored: int
+    runs_scored_before: int
+    event_code: int
+    base_state_before: int = 0
+    base_state_after: int = 0
+    play_end_time: int | None = None
+    ab_index: int
+
+
 class Players(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
-    playerid: int
+    playerid: int = Field(index=True, unique=True)
     name: str
     draft_year: int | None
     mlb_debut_date: str | None
@@ -135,3 +183,51 @@ class PitcherRunValue(SQLModel, table=True):
     name: str
     plate_appearances:int
     total_run_value: float
+
+
+class SeasonVersion(SQLModel, table=True):
+    """Bumped whenever play data for a season changes; cache entries carry the version they saw"""
+    season: int = Field(primary_key=True)
+    version: int = 0
+
+
+class RE24Accumulator(SQLModel, table=True):
+    """Running sum of runs-after and plate appearances per base-out state"""
+    season: int = Field(primary_key=True)
+    base_state: int = Field(primary_key=True)
+    outs: int = Field(primary_key=True)
+    runs_sum: int = 0
+    count: int = 0
+
+
+class PlayerStateCounts(SQLModel, table=True):
+    """Per player and base-out state (base_state * 3 + outs): plate appearances that
+    started there, plate appearances that ended there and runs scored on those that
+    started there. With an RE table, run value is runs + sum(ends * RE) - sum(starts * RE),
+    so player totals can be recomputed exactly whenever the RE table shifts."""
+    season: int = Field(primary_key=True)
+    role: str = Field(primary_key=True)
+    playerid: int = Field(primary_key=True)
+    state: int = Field(primary_key=True)
+    starts: int = 0
+    ends: int = 0
+    runs: int = 0
+
+
+class IngestionLedger(SQLModel, table=True):
+    """Per-game ingestion state, committed in the same transaction as the game's rows"""
+    gameid: int = Field(primary_key=True)
+    status: str  # "done" or "failed"
+    payload_hash: str | None = None
+    # Games.status when the game was last fetched
+    upstream_status: str | None = None
+    # Failed fetches since the game was last stored
+    attempts: int = 0
+    error: str | None = None
+    updated_at: str | None = None
+
+
+class AggregatedGame(SQLModel, table=True):
+    """Games already folded into the accumulators"""
+    gameid: int = Field(primary_key=True)
+    season: int = Field(index=True)
@@ -0,0 +1,74 @@
+"""Typed decoding of the statsapi playByPlay payload
+
+Only the fields the row builder reads are declared. msgspec skips everything
+else (pitch-level playEvents, scoringPlays, playsByInning, ...) while decoding,
+so those parts of the document are never turned into Python objects.
+"""
+
+from collections.abc import Iterator
+
+import msgspec
+
+from .metrics import timer
+
+
+class Person(msgspec.Struct):
+    id: int
+
+
+class Matchup(msgspec.Struct):
+    batter: Person
+    pitcher: Person
+    # Only presence matters: the runner standing on each base after the play
+    postOnFirst: Person | None = None
+    postOnSecond: Person | None = None
+    postOnThird: Person | None = None
+
+
+class About(msgspec.Struct):
+    inning: int
+    halfInning: str
+    atBatIndex: int
+    endTime: str
+
+
+class Count(msgspec.Struct):
+    outs: int
+
+
+class Result(msgspec.Struct):
+    event: str = "n/a"
+
+
+class Movement(msgspec.Struct):
+    end: str | None = None
+
+
+class Runner(msgspec.Struct):
+    movement: Movement
+
+
+class Play(msgspec.Struct):
+    about: About
+    count: Count
+    matchup: Matchup
+    result: Result
+    runners: list[Runner] = []
+
+
+class PlayByPlayPayload(msgspec.Struct):
+    allPlays: list[Play]
+
+
+_decoder = msgspec.json.Decoder(PlayByPlayPayload)
+
+
+def iter_plays(content: bytes) -> Iterator[Play]:
+    """Decode a raw playByPlay response body and iterate over its plays in order.
+
+    The body is decoded right away, so the decode is timed on its own rather
+    than inside whichever loop consumes the plays.
+    """
+    with timer("json_parse"):
+        payload = _decoder.decode(content)
+    return iter(payload.allPlays)
@@ -0,0 +1,13 @@
+"""Worker processes for the CPU-bound batch commands
+
+Workers are spawned rather than forked: polars' thread pool does not survive a
+fork, so a forked worker can hang on its first query. A spawned worker imports
+what it runs afresh, so the functions submitted to it must be module-level.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
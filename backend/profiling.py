@@ -0,0 +1,69 @@
+"""Optional sampling profiler, switched on by an environment variable
+
+With MLB_PROFILE set to an output path, a background thread samples the stack of
+every other thread each MLB_PROFILE_INTERVAL_MS milliseconds. When the process
+exits the samples are written in collapsed-stack format, one `outer;...;inner
+count` line per distinct stack, which flamegraph.pl and speedscope read as is.
+Nothing runs when the variable is unset.
+"""
+
+import atexit
+import os
+import sys
+import threading
+from collections import Counter
+
+from .constants import PROFILE_INTERVAL_MS, PROFILE_PATH
+
+
+class SamplingProfiler:
+    def __init__(self, path: str, interval_ms: float = 5.0):
+        self.path = path
+        self.interval = interval_ms / 1000
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        with open(self.path, "w") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+        print(
+            f"Wrote {sum(self.samples.values())} profile samples to {self.path}",
+            file=sys.stderr,
+        )
+
+
+_profiler: SamplingProfiler | None = None
+
+
+def start_profiler_from_env() -> SamplingProfiler | None:
+    """Start the process-wide profiler if MLB_PROFILE is set; safe to call repeatedly"""
+    global _profiler
+    if PROFILE_PATH and _profiler is None:
+        _profiler = SamplingProfiler(PROFILE_PATH, PROFILE_INTERVAL_MS)
+        _profiler.start()
+        atexit.register(_profiler.stop)
+    return _profiler
@@ -0,0 +1,82 @@
+"""Rebuild PlayByPlay and InningsFinal from the raw payload archive
+
+Decoding and row building are CPU bound, so games are parsed in a pool of worker
+processes that only read archive blobs. The parent is the single writer and
+streams the parsed games through a BatchWriter. Nothing here touches the network.
+"""
+
+import tqdm
+from sqlalchemy import select
+from sqlmodel import Session
+
+from .archive import blob_path, read_payload
+from .data_collection import BatchWriter, ParsedGame, build_play_by_play_rows
+from .db import get_read_engine
+from .ledger import mark_failed
+from .models import Games, IngestionLedger
+from .payloads import iter_plays
+from .processes import process_pool
+
+
+def archived_games(
+    seasons: list[int] | None = None,
+) -> list[tuple[int, str, str | None]]:
+    """(gameid, payload_hash, upstream_status) of every game with an archived payload"""
+    query = (
+        select(
+            IngestionLedger.gameid,
+            IngestionLedger.payload_hash,
+            IngestionLedger.upstream_status,
+        )
+        .where(IngestionLedger.payload_hash.is_not(None))
+        .order_by(IngestionLedger.gameid)
+    )
+    if seasons:
+        gameids = select(Games.gameid).where(Games.season.in_(seasons))
+        query = query.where(IngestionLedger.gameid.in_(gameids))
+    with Session(get_read_engine()) as session:
+        return [
+            (gameid, digest, status)
+            for gameid, digest, status in session.execute(query)
+            if blob_path(digest).exists()
+        ]
+
+
+def parse_archived(entry: tuple[int, str, str | None]) -> ParsedGame | tuple:
+    """Worker: rows for one archived game, or (gameid, error, upstream_status, hash)"""
+    gameid, digest, upstream_status = entry
+    try:
+        plays, innings = build_play_by_play_rows(
+            gameid, iter_plays(read_payload(digest))
+        )
+    except Exception as e:
+        return gameid, repr(e), upstream_status, digest
+    # Without a hash store_games always replaces the rows; the ledger keeps the stored one
+    return ParsedGame(gameid, plays, innings, None, upstream_status)
+
+
+def store_result(writer: BatchWriter, result: ParsedGame | tuple) -> None:
+    if isinstance(result, ParsedGame):
+        writer.add(result)
+    else:
+        print(result[1], result[0])
+        mark_failed(*result)
+
+
+def reparse_archive(
+    seasons: list[int] | None = None, workers: int = 1, batch_size: int = 5000
+) -> int:
+    """Re-run the parser over every archived game of `seasons` (default: all) and
+    replace their rows. Returns the number of games written."""
+    entries = archived_games(seasons)
+    with BatchWriter(batch_size) as writer:
+        if workers <= 1:
+            results = map(parse_archived, entries)
+            for result in tqdm.tqdm(results, total=len(entries)):
+                store_result(writer, result)
+        else:
+            with process_pool(workers) as pool:
+                results = pool.map(parse_archived, entries, chunksize=16)
+                for result in tqdm.tqdm(results, total=len(entries)):
+                    store_result(writer, result)
+    return writer.written
@@ -0,0 +1,114 @@
+"""Schedule ingestion
+
+Every season in a range is fetched concurrently, regular season and postseason
+alike, and written in one transaction per season as an upsert on the unique
+Games.gameid. Reloading a schedule therefore updates game dates and statuses in
+place instead of duplicating games, and only bumps a season's version when one
+of its games actually changed.
+
+Postseason games are ingested and archived like regular-season ones, but the
+season stats read only the regular season (see `season_where` in
+mlbmodels.plays); postseason slices are an explicit `game_types` opt-in.
+"""
+
+import asyncio
+
+import httpx
+from sqlalchemy import or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .constants import BASE_URL, GAME_TYPES
+from .db import chunked, session_scope
+from .ledger import adopt_schedule_status
+from .models import Games, bump_seasons
+
+# Columns a reloaded schedule may change for an existing game
+UPDATED_COLUMNS = (
+    "gameguid",
+    "game_date",
+    "away_team_id",
+    "home_team_id",
+    "game_type",
+    "season",
+    "status",
+)
+
+
+async def fetch_schedules(
+    seasons: list[int], game_types: tuple[str, ...] = GAME_TYPES
+) -> dict[int, list[dict]]:
+    """Fetch the schedule dates of every season in `seasons` concurrently"""
+    async with httpx.AsyncClient(timeout=30) as client:
+        responses = await asyncio.gather(
+            *(
+                client.get(
+                    BASE_URL + "schedule",
+                    params=dict(
+                        sportId=1, season=season, gameTypes=",".join(game_types)
+                    ),
+                )
+                for season in seasons
+            )
+        )
+    for response in responses:
+        response.raise_for_status()
+    return {season: r.json()["dates"] for season, r in zip(seasons, responses)}
+
+
+def schedule_rows(season: int, dates: list[dict]) -> list[dict]:
+    """One Games row per gamePk. A postponed or suspended game is listed on every
+    date it was scheduled for, and the latest listing wins."""
+    rows = {}
+    for date in sorted(dates, key=lambda date: date["date"]):
+        for game in date["games"]:
+            rows[game["gamePk"]] = dict(
+                gameid=game["gamePk"],
+                gameguid=game["gameGuid"],
+                game_date=date["date"],
+                away_team_id=game["teams"]["away"]["team"]["id"],
+                home_team_id=game["teams"]["home"]["team"]["id"],
+                game_type=game["gameType"],
+                season=season,
+                status=game["status"]["detailedState"],
+            )
+    return list(rows.values())
+
+
+def upsert_games(season: int, rows: list[dict]) -> int:
+    """Insert new games and update changed ones in one transaction.
+
+    Returns the number of games inserted or updated.
+    """
+    changed = 0
+    with session_scope() as session:
+        for chunk in chunked(rows, len(Games.__table__.columns)):
+            stmt = sqlite_insert(Games).values(chunk)
+            excluded = {column: stmt.excluded[column] for column in UPDATED_COLUMNS}
+            changed += session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["gameid"],
+                    set_=excluded,
+                    # Unchanged games are skipped, so they do not count as changed
+                    where=or_(
+                        *(
+                            getattr(Games, column).is_distinct_from(value)
+                            for column, value in excluded.items()
+                        )
+                    ),
+                )
+            ).rowcount
+        if changed:
+            bump_seasons(session, [season])
+            adopt_schedule_status(session, season)
+    return changed
+
+
+def load_schedules(
+    seasons: list[int], game_types: tuple[str, ...] = GAME_TYPES
+) -> dict[int, int]:
+    """Fetch and upsert the schedules of `seasons`. Returns the games changed per season"""
+    dates_by_season = asyncio.run(fetch_schedules(seasons, game_types))
+    return {
+        season: upsert_games(season, schedule_rows(season, dates))
+        for season, dates in dates_by_season.items()
+    }
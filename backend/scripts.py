@@ -1,71 +1,195 @@
-import httpx
-from .constants import BASE_URL
-from .models import (
-    Games,
-    PlayByPlay,
-    session,
-    create_db_and_tables,
-)
-import tqdm
-from sqlmodel import select, desc
-from backend.data_collection import get_play_by_play_for_gameid, get_players_for_given_year
+"""Command line entry point: python -m backend.scripts <command>
+
+Each command imports the modules it needs when it runs, so a short command such
+as migrate never pays for importing polars, httpx or the ingestion code.
+"""
+
+import asyncio
+import os
+import sys
+from backend.metrics import summary
+from backend.profiling import start_profiler_from_env
+from backend.constants import GAME_TYPES
 import click
 
-def get_regular_season_games_to_db(year: int):
-    create_db_and_tables()
-    r = httpx.get(BASE_URL + f"schedule?sportId=1&season={year}&gameTypes=R")
-    dates = r.json()["dates"]
-    for date in tqdm.tqdm(dates):
-        for game in date["games"]:
-            game = Games(
-                gameid=game["gamePk"],
-                gameguid=game["gameGuid"],
-                game_date=date["date"],
-                away_team_id=game["teams"]["away"]["team"]["id"],
-                home_team_id=game["teams"]["home"]["team"]["id"],
-                game_type=game["gameType"],
+def bulk_add_play_by_plays(
+    concurrency: int = 1,
+    rate_limit: float | None = 10.0,
+    batch_size: int = 5000,
+    retry_failed: bool = False,
+    refresh: bool = True,
+):
+    """Get the play by play data for every game the ingestion ledger says needs it
+
+    That is games never fetched, games whose schedule status changed since they were
+    fetched, and failed games with attempts left (or every failed game with
+    `retry_failed`). With concurrency above 1 the games are fetched by the async
+    ingestion engine instead of one at a time. Rows are written in transactions of
+    about `batch_size` plays. With `refresh`, the stored RE24 and run-value rows of
+    every season with new games are brought up to date afterwards.
+    """
+    import tqdm
+
+    from backend.data_collection import BatchWriter, get_play_by_play_for_gameid
+    from backend.ingestion import ingest_games
+    from backend.ledger import games_to_fetch
+    from backend.mlbmodels.incremental import refresh_pending_seasons
+
+    missing = games_to_fetch(retry_failed=retry_failed)
+    if concurrency > 1:
+        asyncio.run(
+            ingest_games(
+                missing,
+                concurrency=concurrency,
+                rate_limit=rate_limit,
+                batch_size=batch_size,
             )
-            session.add(game)
-        session.commit()
-
-
-def bulk_add_play_by_plays():
-    """Loop through every game in the Games db and get the play by play data for each game"""
-    games = session.exec(select(Games.gameid).order_by(desc(Games.game_date))).fetchall()
-    got_games = set(
-        session.exec(
-            select(PlayByPlay.gameid)
-            .distinct()
-            .where((PlayByPlay.inning == 9) & (PlayByPlay.inning_half == "top"))
-        ).fetchall()
-    )
-    for game in tqdm.tqdm(games):
-        if game not in got_games:
-            get_play_by_play_for_gameid(game)
+        )
+    else:
+        with BatchWriter(batch_size) as writer:
+            for game, status in tqdm.tqdm(missing.items()):
+                get_play_by_play_for_gameid(game, writer=writer, upstream_status=status)
+    if refresh:
+        for season, added in refresh_pending_seasons().items():
+            print(f"{season}: {added} new games")
+
+
+def add_players_many_years(start_year: int = 2010, end_year: int = 2025):
+    from backend.data_collection import get_players_for_years
+
+    get_players_for_years(list(range(start_year, end_year + 1)))
 
 
-def add_players_many_years():
-    for yr in range(2010, 2026):
-        get_players_for_given_year(yr)
+def parse_seasons(value: str | None) -> list[int] | None:
+    """Parse "2024", "2021,2023" or "2010-2025" into a list of seasons"""
+    if not value:
+        return None
+    seasons = []
+    for part in value.split(","):
+        start, _, end = part.partition("-")
+        seasons.extend(range(int(start), int(end or start) + 1))
+    return seasons
+
+
+def print_run_summary():
+    report = summary()
+    # Only commands that read season frames import the cache
+    cache_module = sys.modules.get("backend.cache")
+    cache = cache_module.frame_cache.stats() if cache_module else {"hit_ratio": None}
+    if cache["hit_ratio"] is not None:
+        report += f"\nframe cache hit ratio {cache['hit_ratio']:.2%} ({cache['hits']} hits, {cache['misses']} misses)"
+    if report:
+        print("\n" + report)
 
 
 @click.group()
-def cli():
-    pass
+@click.pass_context
+def cli(ctx):
+    start_profiler_from_env()
+    ctx.call_on_close(print_run_summary)
+
+@cli.command()
+@click.option("--start-year", type=int, help="The first season to get games for")
+@click.option("--end-year", type=int, help="The last season to get games for")
+@click.option("--game-types", default=",".join(GAME_TYPES), show_default=True, help="Schedule gameTypes to load")
+def get_games(start_year, end_year, game_types):
+    """Load or update the schedules of a range of seasons, postseason included
+
+    Postseason games are stored and backfilled, but season stats only count the
+    regular season.
+    """
+    from backend.migrations import migrate_db
+    from backend.schedule import load_schedules
+
+    # Makes sure games.gameid has its unique index, which the upsert relies on
+    migrate_db()
+    changed = load_schedules(list(range(start_year, end_year + 1)), tuple(game_types.split(",")))
+    for season, games in changed.items():
+        print(f"{season}: {games} games added or updated")
 
 @cli.command()
-@click.option("--start-year", type=int, help="The year to get regular season games for")
-@click.option("--end-year", type=int, help="The year to get regular season games for")
-def get_games(start_year, end_year):
-    for year in range(start_year, end_year+1):
-        get_regular_season_games_to_db(year)
+@click.option("--start-year", type=int, default=2010, show_default=True)
+@click.option("--end-year", type=int, default=2025, show_default=True)
+def get_players(start_year, end_year):
+    """Load every player and their primary position for a range of seasons"""
+    add_players_many_years(start_year, end_year)
 
 @cli.command()
-def bulk_add():
-    bulk_add_play_by_plays()
+@click.option("--concurrency", type=int, default=1, show_default=True, help="Number of games to fetch at once")
+@click.option("--rate-limit", type=float, default=10.0, show_default=True, help="Max requests per second to the stats API")
+@click.option("--batch-size", type=int, default=5000, show_default=True, help="PlayByPlay rows per insert transaction")
+@click.option("--retry-failed", is_flag=True, help="Also retry games that used up their attempts")
+@click.option("--refresh/--no-refresh", default=True, show_default=True, help="Fold the new games into the stored RE24 and run-value tables")
+def bulk_add(concurrency, rate_limit, batch_size, retry_failed, refresh):
+    bulk_add_play_by_plays(
+        concurrency=concurrency,
+        rate_limit=rate_limit,
+        batch_size=batch_size,
+        retry_failed=retry_failed,
+        refresh=refresh,
+    )
+
+@cli.command()
+def migrate():
+    """Add new columns and indexes to an existing playbyplay.db"""
+    from backend.migrations import migrate_db
+
+    migrate_db()
+
+@cli.command("convert-plays")
+@click.option("--to", "target", type=click.Choice(["compact", "wide"]), required=True)
+def convert_plays_storage(target):
+    """Move every play between the wide PlayByPlay and compact CompactPlay formats"""
+    from backend.storage import convert_plays
+
+    moved = convert_plays(target)
+    print(f"Moved {moved} plays to the {target} format")
+
+@cli.command()
+@click.option("--seasons", help="Seasons to snapshot, e.g. 2024 or 2010-2025 (default: all)")
+@click.option("--force", is_flag=True, help="Rebuild even if the season is unchanged")
+def snapshot(seasons, force):
+    """Write Parquet snapshots for seasons whose games changed since the last build"""
+    from backend.mlbmodels.plays import materialize_seasons
+
+    rebuilt = materialize_seasons(parse_seasons(seasons), force=force)
+    print(f"Rebuilt {len(rebuilt)} season snapshots: {rebuilt}")
+
+@cli.command()
+@click.option("--seasons", help="Seasons to refresh, e.g. 2025 or 2010-2025 (default: all)")
+@click.option("--rebuild", is_flag=True, help="Clear the season's running sums and re-aggregate every game")
+def refresh(seasons, rebuild):
+    """Fold newly ingested games into the stored RE24 and run-value tables"""
+    from backend.mlbmodels.incremental import refresh_season
+    from backend.mlbmodels.plays import available_seasons
+
+    for season in parse_seasons(seasons) or available_seasons():
+        added = refresh_season(season, rebuild=rebuild)
+        print(f"{season}: {added} new games")
+
+@cli.command()
+@click.option("--seasons", help="Seasons to recompute, e.g. 2024 or 2010-2025 (default: all)")
+@click.option("--workers", type=int, default=os.cpu_count(), show_default=True, help="Seasons computed in parallel")
+def recompute(seasons, workers):
+    """Recompute and replace the stored RE24 and run-value rows from scratch"""
+    from backend.mlbmodels.plays import available_seasons
+    from backend.mlbmodels.recompute import recompute_seasons
+
+    written = recompute_seasons(parse_seasons(seasons) or available_seasons(), workers=workers)
+    print(f"Recomputed {len(written)} seasons: {sorted(written)}")
+
+@cli.command()
+@click.option("--seasons", help="Seasons to reparse, e.g. 2024 or 2010-2025 (default: all)")
+@click.option("--workers", type=int, default=os.cpu_count(), show_default=True, help="Parser processes")
+@click.option("--batch-size", type=int, default=5000, show_default=True, help="PlayByPlay rows per insert transaction")
+def reparse(seasons, workers, batch_size):
+    """Rebuild PlayByPlay and InningsFinal from the raw payload archive, offline"""
+    from backend.reparse import reparse_archive
+
+    written = reparse_archive(parse_seasons(seasons), workers=workers, batch_size=batch_size)
+    print(f"Reparsed {written} games; run refresh or recompute to update the derived tables")
 
 if __name__ == "__main__":
     # create_db_and_tables()
-    # get_regular_season_games_to_db(2024)
     # bulk_add_play_by_plays()
     cli()
@@ -0,0 +1,162 @@
+"""Serving helpers for DataFrame endpoints
+
+Frames are computed by the job scheduler, so blocking SQLite and polars work
+never runs on the event loop and concurrent identical requests share one
+computation. A request waits up to JOB_WAIT_SECONDS for its frame; a longer job
+is answered with 202 Accepted and a Location to poll at /jobs/{id}.
+
+Responses are encoded by polars itself, as JSON rows or as an Arrow IPC stream
+when the client asks for one. They carry an ETag derived from the season data
+versions, so clients and proxies can revalidate with If-None-Match and get a 304
+without anything being recomputed.
+"""
+
+import hashlib
+import io
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Literal
+
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from .cache import frame_cache
+from .constants import JOB_WAIT_SECONDS, RESPONSE_MAX_AGE
+from .jobs import Job, scheduler
+from .metrics import timed
+
+if TYPE_CHECKING:
+    # Only annotations need polars; the frames themselves come from the models
+    import polars as pl
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PAGING_PARAMS = {"limit", "offset", "sort", "order"}
+
+
+def data_versions(seasons: list[int] | None):
+    """Versions of the seasons a request reads (of every season when None)"""
+    frame_cache.refresh_versions()
+    if seasons is None:
+        return frame_cache.version_for(None)
+    return [(season, frame_cache.version_for(season)) for season in seasons]
+
+
+def data_etag(request: Request, versions) -> str:
+    """Weak ETag over the route, its parameters and the versions of the seasons it reads"""
+    params = sorted(request.query_params.multi_items())
+    key = repr((request.url.path, params, versions, request.headers.get("accept")))
+    return 'W/"' + hashlib.blake2b(key.encode(), digest_size=12).hexdigest() + '"'
+
+
+def job_key(request: Request, versions) -> str:
+    """What a request computes: like the ETag, minus paging and encoding, which
+    are applied to the shared frame afterwards"""
+    params = sorted(
+        (name, value)
+        for name, value in request.query_params.multi_items()
+        if name not in PAGING_PARAMS
+    )
+    return repr((request.url.path, params, versions))
+
+
+@dataclass
+class Paging:
+    """limit/offset/sort query parameters shared by the frame endpoints"""
+
+    limit: int | None = Query(None, ge=1)
+    offset: int = Query(0, ge=0)
+    sort: str | None = None
+    order: Literal["asc", "desc"] = "desc"
+
+    def apply(self, df: "pl.DataFrame") -> "pl.DataFrame":
+        if self.sort is not None:
+            if self.sort not in df.columns:
+                raise HTTPException(
+                    400, f"Cannot sort by {self.sort!r}; columns are {df.columns}"
+                )
+            df = df.sort(self.sort, descending=self.order == "desc", nulls_last=True)
+        return df.slice(self.offset, self.limit)
+
+
+@timed("serialize")
+def encode(df: "pl.DataFrame", accept: str) -> tuple[bytes, str]:
+    if ARROW_STREAM in accept:
+        buffer = io.BytesIO()
+        df.write_ipc_stream(buffer)
+        return buffer.getvalue(), ARROW_STREAM
+    # Row-oriented JSON written in Rust, without building Python dicts per row
+    return df.write_json().encode(), "application/json"
+
+
+async def serve_frame(
+    request: Request,
+    compute: Callable[[], "pl.DataFrame"],
+    seasons: list[int] | None,
+    paging: Paging,
+) -> Response:
+    """Compute (as a job), page and encode a frame, honouring If-None-Match"""
+    versions = await run_in_threadpool(data_versions, seasons)
+    etag = data_etag(request, versions)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={RESPONSE_MAX_AGE}",
+        "Vary": "Accept",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    job = await scheduler.run(job_key(request, versions), compute, JOB_WAIT_SECONDS)
+    if not job.future.done():
+        return accepted(request, job)
+    if job.status == "failed":
+        return failed(job)
+    return await frame_response(request, job.future.result(), paging, headers)
+
+
+def accepted(request: Request, job: Job) -> JSONResponse:
+    # Polling with the request's paging returns the page it asked for
+    location = str(
+        request.url_for("job_status", job_id=job.id).include_query_params(
+            **{
+                name: value
+                for name, value in request.query_params.items()
+                if name in PAGING_PARAMS
+            }
+        )
+    )
+    return JSONResponse(
+        job.describe() | {"location": location},
+        status_code=202,
+        headers={"Location": location, "Retry-After": "1"},
+    )
+
+
+def failed(job: Job) -> JSONResponse:
+    return JSONResponse(job.describe(), status_code=500)
+
+
+async def frame_response(
+    request: Request, df: "pl.DataFrame", paging: Paging, headers: dict[str, str]
+) -> Response:
+    headers["X-Total-Count"] = str(df.height)
+    df = paging.apply(df)
+    body, media_type = await run_in_threadpool(
+        encode, df, request.headers.get("accept", "")
+    )
+    return Response(body, media_type=media_type, headers=headers)
+
+
+async def serve_job(request: Request, job_id: str, paging: Paging) -> Response:
+    """A job's frame once it is done (paged and encoded like the endpoint that
+    started it), 202 while it runs, 500 if it failed"""
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"No job {job_id!r}; finished jobs expire")
+    if not job.future.done():
+        return accepted(request, job)
+    if job.status == "failed":
+        return failed(job)
+    return await frame_response(
+        request, job.future.result(), paging, {"Cache-Control": "no-store"}
+    )
@@ -0,0 +1,181 @@
+"""Compact play storage
+
+PlayByPlay keeps every play in the wide format the ingestion code builds: the
+result as free text, six runner booleans and an ISO end time. CompactPlay holds
+the same plays with
+
+- the result replaced by a small integer code from the EventCode table
+- no runner booleans, since base_state_before/after encode them bit for bit
+- play_end_time as epoch milliseconds
+
+A database keeps its plays in one format at a time, recorded in SQLite's
+`PRAGMA user_version`. Writers and the season query check it, so the rest of
+the code never needs to know which table holds the plays. `convert_plays`
+moves every row from one format to the other in a single transaction.
+"""
+
+import datetime
+
+from sqlalchemy import Connection, Engine, insert, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, SQLModel
+
+from .db import get_engine
+from .models import CompactPlay, EventCode
+
+WIDE = 0
+COMPACT = 1
+FORMATS = {"wide": WIDE, "compact": COMPACT}
+
+# SQLite expressions between the ISO end time and epoch milliseconds
+ISO_TO_EPOCH_MS = (
+    "CAST(strftime('%s', p.play_end_time) AS INTEGER) * 1000"
+    " + CAST(substr(strftime('%f', p.play_end_time), 4) AS INTEGER)"
+)
+EPOCH_MS_TO_ISO = (
+    "strftime('%Y-%m-%dT%H:%M:%f', p.play_end_time / 1000.0, 'unixepoch') || 'Z'"
+)
+
+
+def play_format(connection: Connection) -> int:
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def uses_compact_plays(connection: Connection) -> bool:
+    return play_format(connection) == COMPACT
+
+
+def epoch_ms(value: str | None) -> int | None:
+    if value is None:
+        return None
+    return round(datetime.datetime.fromisoformat(value).timestamp() * 1000)
+
+
+def event_codes(session: Session, results: set[str]) -> dict[str, int]:
+    """Code of every result in `results`, adding new ones to EventCode"""
+    if results:
+        session.execute(
+            sqlite_insert(EventCode)
+            .values([dict(result=result) for result in sorted(results)])
+            .on_conflict_do_nothing(index_elements=["result"])
+        )
+    rows = session.execute(
+        select(EventCode.result, EventCode.code).where(EventCode.result.in_(results))
+    )
+    return dict(rows.all())
+
+
+def insert_compact_plays(session: Session, plays: list[dict]) -> None:
+    """Insert wide play rows, as built by build_play_by_play_rows, into CompactPlay"""
+    codes = event_codes(session, {row["result"] for row in plays})
+    session.execute(
+        insert(CompactPlay),
+        [
+            dict(
+                gameid=row["gameid"],
+                inning=row["inning"],
+                inning_half=row["inning_half"],
+                batter=row["batter"],
+                pitcher=row["pitcher"],
+                outs=row["outs"],
+                runs_scored=row["runs_scored"],
+                runs_scored_before=row["runs_scored_before"],
+                event_code=codes[row["result"]],
+                base_state_before=row["base_state_before"],
+                base_state_after=row["base_state_after"],
+                play_end_time=epoch_ms(row["play_end_time"]),
+                ab_index=row["ab_index"],
+            )
+            for row in plays
+        ],
+    )
+
+
+def wide_play_rows(connection: Connection, gameid: int) -> list[dict]:
+    """One game's plays as wide PlayByPlay rows, whichever format stores them"""
+    if not uses_compact_plays(connection):
+        query = "SELECT * FROM playbyplay WHERE gameid = :gameid"
+    else:
+        query = f"""
+            SELECT p.id, p.gameid, p.inning, p.inning_half, p.batter, p.pitcher,
+                (p.base_state_before & 1) > 0 AS runner_on_first,
+                (p.base_state_before & 2) > 0 AS runner_on_second,
+                (p.base_state_before & 4) > 0 AS runner_on_third,
+                (p.base_state_after & 1) > 0 AS runner_on_first_after,
+                (p.base_state_after & 2) > 0 AS runner_on_second_after,
+                (p.base_state_after & 4) > 0 AS runner_on_third_after,
+                p.outs, p.runs_scored, p.runs_scored_before, e.result,
+                p.base_state_before, p.base_state_after,
+                {EPOCH_MS_TO_ISO} AS play_end_time, p.ab_index
+            FROM compactplay p JOIN eventcode e ON e.code = p.event_code
+            WHERE p.gameid = :gameid
+            """
+    rows = connection.execute(text(query), {"gameid": gameid})
+    return [dict(row._mapping) for row in rows]
+
+
+def convert_plays(target: str, engine: Engine | None = None) -> int:
+    """Move every play into the `target` format ("wide" or "compact").
+
+    Returns the number of rows moved. Runs as one transaction, then VACUUMs and
+    checkpoints so the file actually shrinks.
+    """
+    engine = engine or get_engine()
+    SQLModel.metadata.create_all(
+        engine, tables=[EventCode.__table__, CompactPlay.__table__]
+    )
+    with engine.begin() as conn:
+        if play_format(conn) == FORMATS[target]:
+            return 0
+        if target == "compact":
+            conn.execute(
+                text(
+                    "INSERT OR IGNORE INTO eventcode (result) "
+                    "SELECT DISTINCT result FROM playbyplay ORDER BY result"
+                )
+            )
+            moved = conn.execute(
+                text(
+                    f"""
+                    INSERT INTO compactplay (gameid, inning, inning_half, batter, pitcher,
+                        outs, runs_scored, runs_scored_before, event_code,
+                        base_state_before, base_state_after, play_end_time, ab_index)
+                    SELECT p.gameid, p.inning, p.inning_half, p.batter, p.pitcher,
+                        p.outs, p.runs_scored, p.runs_scored_before, e.code,
+                        p.base_state_before, p.base_state_after, {ISO_TO_EPOCH_MS},
+                        p.ab_index
+                    FROM playbyplay p JOIN eventcode e ON e.result = p.result
+                    ORDER BY p.id
+                    """
+                )
+            ).rowcount
+            conn.execute(text("DELETE FROM playbyplay"))
+        else:
+            moved = conn.execute(
+                text(
+                    f"""
+                    INSERT INTO playbyplay (gameid, inning, inning_half, batter, pitcher,
+                        runner_on_first, runner_on_second, runner_on_third,
+                        runner_on_first_after, runner_on_second_after,
+                        runner_on_third_after, outs, runs_scored, runs_scored_before,
+                        result, base_state_before, base_state_after, play_end_time,
+                        ab_index)
+                    SELECT p.gameid, p.inning, p.inning_half, p.batter, p.pitcher,
+                        (p.base_state_before & 1) > 0, (p.base_state_before & 2) > 0,
+                        (p.base_state_before & 4) > 0, (p.base_state_after & 1) > 0,
+                        (p.base_state_after & 2) > 0, (p.base_state_after & 4) > 0,
+                        p.outs, p.runs_scored, p.runs_scored_before, e.result,
+                        p.base_state_before, p.base_state_after, {EPOCH_MS_TO_ISO},
+                        p.ab_index
+                    FROM compactplay p JOIN eventcode e ON e.code = p.event_code
+                    ORDER BY p.id
+                    """
+                )
+            ).rowcount
+            conn.execute(text("DELETE FROM compactplay"))
+        conn.exec_driver_sql(f"PRAGMA user_version = {FORMATS[target]}")
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+        # Under WAL the rewritten pages land in the log; fold them back to shrink the file
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return moved
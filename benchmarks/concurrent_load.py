@@ -0,0 +1,158 @@
+"""Concurrent read/write load on the shared SQLite engines
+
+Reader threads run the API's season queries while a writer thread keeps
+inserting batches of plays, the same mix as serving traffic during a nightly
+ingestion. Works on a copy of the database so the original is left untouched:
+
+    python -m benchmarks.concurrent_load playbyplay.db --season 2024 --readers 8
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import click
+
+
+def percentile(timings: list[float], q: float) -> float:
+    if not timings:
+        return float("nan")
+    return sorted(timings)[min(len(timings) - 1, int(q * len(timings)))]
+
+
+@click.command()
+@click.argument("db_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--season", type=int, required=True)
+@click.option("--readers", type=int, default=8, show_default=True)
+@click.option("--seconds", type=float, default=20.0, show_default=True)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=5000,
+    show_default=True,
+    help="Plays per write transaction",
+)
+def main(db_path, season, readers, seconds, batch_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / "playbyplay.db"
+        shutil.copy(db_path, copy)
+        # Settings are read when backend.constants is imported, so set them first
+        os.environ["MLB_DATABASE_URL"] = f"sqlite:///{copy}"
+        from backend.data_collection import insert_play_by_play_rows
+        from backend.db import dispose_engines, get_read_engine, session_scope
+        from backend.migrations import migrate_db
+        from backend.mlbmodels.plays import load_year_from_db
+        from backend.mlbmodels.re24 import BatterRunValue, read_run_value_table
+        from backend.models import Games
+        from backend.storage import wide_play_rows
+        from sqlalchemy import insert, text
+
+        migrate_db()
+        stop = threading.Event()
+        lock = threading.Lock()
+        read_timings: list[float] = []
+        write_timings: list[float] = []
+        errors: Counter[str] = Counter()
+        written: list[int] = []
+
+        def reader(index: int) -> None:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    if index % 2:
+                        load_year_from_db(season)
+                    else:
+                        read_run_value_table(BatterRunValue, season)
+                except Exception as e:
+                    with lock:
+                        errors[f"read: {type(e).__name__}: {str(e)[:60]}"] += 1
+                    continue
+                with lock:
+                    read_timings.append(time.perf_counter() - start)
+
+        # Writes replay one real game of the season under fresh gameids
+        with get_read_engine().connect() as connection:
+            template = connection.execute(
+                text("SELECT gameid FROM games WHERE season = :season LIMIT 1"),
+                {"season": season},
+            ).scalar_one()
+            game_plays = wide_play_rows(connection, template)
+            game_innings = [
+                dict(row._mapping)
+                for row in connection.execute(
+                    text("SELECT * FROM inningsfinal WHERE gameid = :g"),
+                    {"g": template},
+                )
+            ]
+            game = dict(
+                connection.execute(
+                    text("SELECT * FROM games WHERE gameid = :g"), {"g": template}
+                )
+                .one()
+                ._mapping
+            )
+        games_per_batch = max(1, batch_size // max(1, len(game_plays)))
+
+        def writer() -> None:
+            gameid = 900_000_000
+            while not stop.is_set():
+                gameids = range(gameid, gameid + games_per_batch)
+                gameid += games_per_batch
+                start = time.perf_counter()
+                try:
+                    with session_scope() as session:
+                        session.execute(
+                            insert(Games),
+                            [dict(game, id=None, gameid=g) for g in gameids],
+                        )
+                        insert_play_by_play_rows(
+                            session,
+                            [
+                                dict(r, id=None, gameid=g)
+                                for g in gameids
+                                for r in game_plays
+                            ],
+                            [
+                                dict(r, id=None, gameid=g)
+                                for g in gameids
+                                for r in game_innings
+                            ],
+                        )
+                except Exception as e:
+                    with lock:
+                        errors[f"write: {type(e).__name__}: {str(e)[:60]}"] += 1
+                    continue
+                write_timings.append(time.perf_counter() - start)
+                written.append(len(gameids) * len(game_plays))
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        dispose_engines()
+
+    print(f"{'':>8}{'count':>10}{'p50 s':>10}{'p95 s':>10}{'max s':>10}")
+    for label, timings in (("reads", read_timings), ("writes", write_timings)):
+        print(
+            f"{label:>8}{len(timings):>10}{percentile(timings, 0.5):>10.4f}"
+            f"{percentile(timings, 0.95):>10.4f}{max(timings, default=float('nan')):>10.4f}"
+        )
+    print(f"write throughput: {sum(written) / seconds:,.0f} plays/s")
+    if errors:
+        print("errors:")
+        for message, count in errors.most_common():
+            print(f"  {count:>6}  {message}")
+    else:
+        print("errors: none")
+
+
+if __name__ == "__main__":
+    main()
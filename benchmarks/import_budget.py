@@ -0,0 +1,95 @@
+"""Import-time budget for the API and CLI entry points
+
+Each entry point is imported in fresh interpreters, and the median import time
+is checked against its budget. The check also makes sure the heavy libraries the
+entry point is meant to load lazily are still absent right after import. Exits
+non-zero when either check fails, listing the slowest imports:
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --scale 2  # on a slower machine
+"""
+
+import statistics
+import subprocess
+import sys
+
+import click
+
+LAZY = ("polars", "numpy", "httpx", "hishel", "tenacity", "msgspec", "zstandard")
+# module: (budget in seconds, libraries that must not be imported with it)
+BUDGETS = {
+    "backend.main": (1.0, LAZY),
+    "backend.scripts": (0.2, (*LAZY, "sqlmodel", "sqlalchemy", "fastapi")),
+}
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(",".join(name for name in {forbidden!r} if name in sys.modules))
+"""
+
+
+def measure(module: str, forbidden: tuple[str, ...]) -> tuple[float, list[str]]:
+    """Seconds to import `module` in a new interpreter, and the forbidden modules it loaded"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, forbidden=forbidden)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    seconds, loaded = result.stdout.splitlines()
+    return float(seconds), [name for name in loaded.split(",") if name]
+
+
+def slowest_imports(module: str, top: int) -> list[tuple[int, str]]:
+    """The `top` modules with the largest cumulative import time, from -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        timings.append((int(cumulative), name.strip()))
+    return sorted(timings, reverse=True)[:top]
+
+
+@click.command()
+@click.option("--repeat", type=int, default=7, show_default=True)
+@click.option(
+    "--scale",
+    type=float,
+    default=1.0,
+    show_default=True,
+    help="Multiply every budget, for slower machines",
+)
+def main(repeat, scale):
+    failed = False
+    print(f"{'':<20}{'median s':>10}{'budget s':>10}")
+    for module, (budget, forbidden) in BUDGETS.items():
+        runs = [measure(module, forbidden) for _ in range(repeat)]
+        median = statistics.median(seconds for seconds, _ in runs)
+        loaded = sorted({name for _, names in runs for name in names})
+        over = median > budget * scale
+        print(
+            f"{module:<20}{median:>10.3f}{budget * scale:>10.3f}"
+            + ("  <- over budget" if over else "")
+        )
+        if loaded:
+            print(f"  imported eagerly: {', '.join(loaded)}")
+        if over or loaded:
+            failed = True
+            for cumulative, name in slowest_imports(module, 10):
+                print(f"  {cumulative / 1e6:>8.3f}s  {name}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Cold-query latency of the season join before and after `migrate`
+
+Works on a copy of the database so the original is left untouched:
+
+    python -m benchmarks.query_latency playbyplay.db --year 2024
+"""
+
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import click
+from sqlalchemy import create_engine, text
+from sqlmodel import SQLModel
+
+from backend.migrations import migrate_db
+from backend.mlbmodels.plays import year_query
+
+# The season filter as it was before games had a stored season column
+LEGACY_FILTER = "WHERE substring(g.game_date, 1, 4) = '{year}'"
+
+
+def legacy_year_query(year: int) -> str:
+    return year_query(year).replace(
+        f"WHERE g.season = {year}", LEGACY_FILTER.format(year=year)
+    )
+
+
+def drop_indexes(url: str) -> None:
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        conn.execute(text("DROP TABLE IF EXISTS sqlite_stat1"))
+    engine.dispose()
+
+
+def time_cold_query(url: str, query: str, repeat: int) -> list[float]:
+    """Run `query` on a fresh engine each time so no connection-level page cache survives"""
+    timings = []
+    for _ in range(repeat):
+        engine = create_engine(url)
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            rows = conn.execute(text(query)).fetchall()
+        timings.append(time.perf_counter() - start)
+        engine.dispose()
+    print(f"  {len(rows)} rows")
+    return timings
+
+
+@click.command()
+@click.argument("db_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--year", type=int, required=True)
+@click.option("--repeat", type=int, default=5, show_default=True)
+def main(db_path, year, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / "playbyplay.db"
+        shutil.copy(db_path, copy)
+        url = f"sqlite:///{copy}"
+
+        drop_indexes(url)
+        print("before migrate:")
+        before = time_cold_query(url, legacy_year_query(year), repeat)
+
+        engine = create_engine(url)
+        migrate_db(engine)
+        engine.dispose()
+        print("after migrate:")
+        after = time_cold_query(url, year_query(year), repeat)
+
+    print(f"{'':>16}{'median s':>12}{'min s':>12}")
+    for label, timings in (("before", before), ("after", after)):
+        print(f"{label:>16}{statistics.median(timings):>12.4f}{min(timings):>12.4f}")
+    print(f"speedup: {statistics.median(before) / statistics.median(after):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Offline benchmark suite for ingestion, the season pipeline and the API
+
+Builds a synthetic database of 1 to 20 seasons in a temporary directory, then times:
+
+- ingestion: payload decoding and row building, and batched row writes
+- reparsing every game from the raw payload archive
+- get_year_query_db on a cold cache
+- RE24 and run values (batter and pitcher) from a loaded season frame
+- RE24 over every season at once
+- API latency of the main endpoints, cold and warm
+
+Every run is appended as one JSON line to the history file, together with the
+commit and library versions. Runs with the same scale are compared against the
+previous one, so a regression shows up as a ratio:
+
+    python -m benchmarks.suite --seasons 3
+"""
+
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+from benchmarks.synthetic import GAMES_PER_SEASON, populate_database, season_list
+
+HISTORY = Path(__file__).parent / "history.jsonl"
+# A timing this much slower than the previous comparable run is flagged
+REGRESSION_RATIO = 1.2
+
+
+def timed(func, repeat: int, setup=None) -> float:
+    """Median wall time of `func` over `repeat` runs, calling `setup` untimed before each"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(seasons: list[int], games_per_season: int, repeat: int) -> dict:
+    results = {}
+    ingest = populate_database(seasons, games_per_season)
+    results["ingest_parse_s"] = ingest["parse_s"]
+    results["ingest_write_s"] = ingest["write_s"]
+    results["ingest_games_per_sec"] = ingest["games"] / (
+        ingest["parse_s"] + ingest["write_s"]
+    )
+    results["plays"] = ingest["plays"]
+
+    from backend.reparse import reparse_archive
+
+    results["reparse_s"] = timed(
+        lambda: reparse_archive(seasons, workers=os.cpu_count()), 1
+    )
+
+    # Imported only now that the settings point at the synthetic database
+    from fastapi.testclient import TestClient
+
+    from backend.cache import frame_cache
+    from backend.main import app
+    from backend.mlbmodels.plays import get_year_query_db
+    from backend.mlbmodels.re24 import (
+        add_run_values,
+        aggregate_run_value,
+        compute_re24,
+        re24_for_range,
+    )
+
+    year = seasons[-1]
+    results["year_query_cold_s"] = timed(
+        lambda: get_year_query_db(year), repeat, setup=frame_cache.clear
+    )
+    plays = get_year_query_db(year)
+    results["re24_s"] = timed(lambda: compute_re24(plays.lazy()), repeat)
+    re = compute_re24(plays.lazy())
+    results["run_values_s"] = timed(
+        lambda: [
+            aggregate_run_value(add_run_values(plays, re), role)
+            for role in ("batter", "pitcher")
+        ],
+        repeat,
+    )
+    results["re24_all_seasons_cold_s"] = timed(
+        lambda: re24_for_range(seasons), repeat, setup=frame_cache.clear
+    )
+
+    client = TestClient(app)
+    for name, path in (
+        ("api_re24", f"/re24/{year}"),
+        ("api_batters", f"/run-value/batters/{year}?limit=50"),
+        ("api_teams", f"/run-value/teams/{year}"),
+        ("api_re24_range", f"/re24?start={seasons[0]}-04-01&end={year}-06-30"),
+    ):
+        results[f"{name}_cold_s"] = timed(
+            lambda: client.get(path).raise_for_status(), repeat, setup=frame_cache.clear
+        )
+        client.get(path)
+        results[f"{name}_warm_s"] = timed(
+            lambda: client.get(path).raise_for_status(), repeat
+        )
+    return results
+
+
+def previous_run(history: Path, params: dict) -> dict | None:
+    if not history.exists():
+        return None
+    matching = [
+        entry
+        for entry in map(json.loads, history.read_text().splitlines())
+        if entry["params"] == params
+    ]
+    return matching[-1] if matching else None
+
+
+@click.command()
+@click.option("--seasons", type=click.IntRange(1, 20), default=1, show_default=True)
+@click.option(
+    "--games-per-season", type=int, default=GAMES_PER_SEASON, show_default=True
+)
+@click.option("--repeat", type=int, default=5, show_default=True)
+@click.option(
+    "--history",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=HISTORY,
+    show_default=True,
+)
+@click.option("--label", help="Free-form note stored with the run")
+def main(seasons, games_per_season, repeat, history, label):
+    params = dict(seasons=seasons, games_per_season=games_per_season, repeat=repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Settings are read when backend.constants is imported, so set them first
+        os.environ["MLB_DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'playbyplay.db'}"
+        os.environ["MLB_SNAPSHOT_DIR"] = str(Path(tmp) / "snapshots")
+        os.environ["MLB_ARCHIVE_DIR"] = str(Path(tmp) / "archive")
+        # Time the computation itself rather than the 202 a slow request would get
+        os.environ["MLB_JOB_WAIT_SECONDS"] = "3600"
+        results = run_benchmarks(season_list(seasons), games_per_season, repeat)
+
+        from backend.db import dispose_engines
+
+        dispose_engines()
+
+    import polars as pl
+
+    entry = dict(
+        timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        commit=git_commit(),
+        label=label,
+        python=platform.python_version(),
+        polars=pl.__version__,
+        params=params,
+        results=results,
+    )
+    before = previous_run(history, params)
+    history.parent.mkdir(parents=True, exist_ok=True)
+    with history.open("a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+    print(f"{'':<28}{'now':>12}{'previous':>12}{'ratio':>8}")
+    for name, value in results.items():
+        old = before["results"].get(name) if before else None
+        ratio = value / old if old else None
+        flag = (
+            "  <- slower"
+            if ratio and name.endswith("_s") and ratio > REGRESSION_RATIO
+            else ""
+        )
+        print(
+            f"{name:<28}{value:>12.4f}"
+            + (f"{old:>12.4f}{ratio:>8.2f}{flag}" if old else "")
+        )
+    print(f"appended to {history}")
+
+
+if __name__ == "__main__":
+    main()
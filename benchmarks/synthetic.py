@@ -0,0 +1,402 @@
+"""Synthetic seasons for benchmarking without statsapi.mlb.com
+
+Payloads follow the shape of the real playByPlay response: the fields the parser
+reads, plus per-pitch playEvents and the other bulk a real document carries, so
+decoding costs are representative. Games are simulated plate appearance by
+plate appearance from league-average event rates. The bottom of the ninth is
+skipped when the home team leads, walk-offs end the game, and ties go to extra
+innings. Everything is seeded, so the same arguments always produce the same data.
+
+Write a populated database to a path:
+
+    python -m benchmarks.synthetic /tmp/synthetic.db --seasons 3
+"""
+
+import datetime
+import json
+import os
+import random
+import time
+from pathlib import Path
+
+import click
+
+TEAMS = list(range(108, 138))
+GAMES_PER_SEASON = 2430
+LAST_SEASON = 2025
+
+# (event, probability) of every plate appearance outcome, roughly league average
+EVENTS = [
+    ("Strikeout", 0.225),
+    ("Groundout", 0.185),
+    ("Flyout", 0.115),
+    ("Lineout", 0.055),
+    ("Pop Out", 0.045),
+    ("Grounded Into DP", 0.02),
+    ("Sac Fly", 0.007),
+    ("Single", 0.14),
+    ("Double", 0.045),
+    ("Triple", 0.004),
+    ("Home Run", 0.032),
+    ("Walk", 0.085),
+    ("Hit By Pitch", 0.011),
+    ("Field Error", 0.006),
+]
+EVENT_NAMES = [event for event, _ in EVENTS]
+EVENT_WEIGHTS = [weight for _, weight in EVENTS]
+OUTS = {"Strikeout", "Groundout", "Flyout", "Lineout", "Pop Out"}
+BASE_NAMES = ["1B", "2B", "3B"]
+
+
+def batters(team: int) -> list[int]:
+    return [team * 1000 + i for i in range(13)]
+
+
+def pitchers(team: int) -> list[int]:
+    return [team * 1000 + 50 + i for i in range(13)]
+
+
+def player_rows(seasons: list[int]) -> dict[int, dict]:
+    """Players rows for every synthetic roster, in the shape upsert_players takes"""
+    rows = {}
+    for team in TEAMS:
+        for i, playerid in enumerate(batters(team) + pitchers(team)):
+            position = "1" if i >= 13 else str(2 + i % 8)
+            rows[playerid] = dict(
+                playerid=playerid,
+                name=f"Player {playerid}",
+                draft_year=None,
+                mlb_debut_date=None,
+                years_positions={str(season): position for season in seasons},
+            )
+    return rows
+
+
+def schedule(season: int, games: int, first_gameid: int) -> list[dict]:
+    """Games rows for a season: 15 games a day from April 1st, every team once a day"""
+    rng = random.Random(season)
+    rows = []
+    day = 0
+    while len(rows) < games:
+        teams = TEAMS[:]
+        rng.shuffle(teams)
+        date = datetime.date(season, 4, 1) + datetime.timedelta(days=day)
+        for away, home in zip(teams[::2], teams[1::2]):
+            if len(rows) == games:
+                break
+            gameid = first_gameid + len(rows)
+            rows.append(
+                dict(
+                    gameid=gameid,
+                    gameguid=f"synthetic-{gameid}",
+                    game_date=date.isoformat(),
+                    away_team_id=away,
+                    home_team_id=home,
+                    game_type="R",
+                    season=season,
+                    status="Final",
+                )
+            )
+        day += 1
+    return rows
+
+
+def pitch_events(rng: random.Random, count: int) -> list[dict]:
+    """Per-pitch detail the parser never reads, but a real payload is mostly made of"""
+    return [
+        {
+            "details": {
+                "call": {"code": "B", "description": "Ball"},
+                "description": "Ball",
+                "type": {"code": "FF", "description": "Four-Seam Fastball"},
+            },
+            "count": {"balls": i % 4, "strikes": i % 3, "outs": 0},
+            "pitchData": {
+                "startSpeed": round(rng.uniform(78, 100), 1),
+                "endSpeed": round(rng.uniform(70, 92), 1),
+                "strikeZoneTop": 3.4,
+                "strikeZoneBottom": 1.6,
+                "coordinates": {
+                    name: round(rng.uniform(-50, 50), 2)
+                    for name in ("aY", "aZ", "pfxX", "pfxZ", "pX", "pZ", "vX0", "vY0")
+                },
+                "breaks": {"spinRate": rng.randint(1800, 2600), "spinDirection": 200},
+            },
+            "index": i,
+            "pitchNumber": i + 1,
+            "isPitch": True,
+            "type": "pitch",
+        }
+        for i in range(count)
+    ]
+
+
+def advance(event: str, bases: list[bool], outs: int, rng: random.Random):
+    """Bases after the play, runs scored on it and outs made"""
+    first, second, third = bases
+    if event in OUTS:
+        return bases, 0, 1
+    if event == "Grounded Into DP":
+        if first and outs < 2:
+            return [False, second, third], 0, 2
+        return bases, 0, 1
+    if event == "Sac Fly":
+        if third and outs < 2:
+            return [first, second, False], 1, 1
+        return bases, 0, 1
+    if event in ("Walk", "Hit By Pitch"):
+        # Only forced runners move
+        if not first:
+            return [True, second, third], 0, 0
+        if not second:
+            return [True, True, third], 0, 0
+        return [True, True, True], int(third), 0
+    if event in ("Single", "Field Error"):
+        home_from_second = second and rng.random() < 0.6
+        return (
+            [True, first, second and not home_from_second],
+            third + home_from_second,
+            0,
+        )
+    if event == "Double":
+        home_from_first = first and rng.random() < 0.4
+        return (
+            [False, True, first and not home_from_first],
+            third + second + home_from_first,
+            0,
+        )
+    if event == "Triple":
+        return [False, False, True], first + second + third, 0
+    # Home Run
+    return [False, False, False], 1 + first + second + third, 0
+
+
+def game_payload(game: dict, seed: int = 0) -> dict:
+    """A full playByPlay document for one game"""
+    rng = random.Random(game["gameid"] * 7919 + seed)
+    lineups = {
+        "top": batters(game["away_team_id"]),
+        "bottom": batters(game["home_team_id"]),
+    }
+    staffs = {
+        "top": pitchers(game["home_team_id"]),
+        "bottom": pitchers(game["away_team_id"]),
+    }
+    next_batter = {"top": 0, "bottom": 0}
+    starter = rng.randrange(5)
+    score = {"top": 0, "bottom": 0}
+    clock = datetime.datetime.fromisoformat(game["game_date"] + "T23:05:00")
+    plays = []
+    inning = 0
+    while True:
+        inning += 1
+        for half in ("top", "bottom"):
+            if half == "bottom" and inning >= 9 and score["bottom"] > score["top"]:
+                break
+            outs = 0
+            bases = [False, False, False]
+            while outs < 3:
+                batter = lineups[half][next_batter[half] % 9]
+                next_batter[half] += 1
+                pitcher = staffs[half][
+                    starter if inning <= 6 else 5 + min(inning, 12) - 7
+                ]
+                event = rng.choices(EVENT_NAMES, EVENT_WEIGHTS)[0]
+                before = bases
+                bases, scored, made = advance(event, bases, outs, rng)
+                outs = min(3, outs + made)
+                if outs == 3:
+                    bases = [False, False, False]
+                score[half] += scored
+                runners = (
+                    [
+                        {
+                            "movement": {"start": None, "end": "score"},
+                            "details": {"event": event},
+                        }
+                        for _ in range(scored)
+                    ]
+                    + [
+                        {
+                            "movement": {"start": None, "end": None, "isOut": True},
+                            "details": {"event": event},
+                        }
+                        for _ in range(made)
+                    ]
+                    + [
+                        {
+                            "movement": {"start": None, "end": BASE_NAMES[i]},
+                            "details": {"event": event},
+                        }
+                        for i, occupied in enumerate(bases)
+                        if occupied and not before[i]
+                    ]
+                )
+                start = clock
+                clock += datetime.timedelta(seconds=rng.randint(90, 300))
+                matchup = {
+                    "batter": {
+                        "id": batter,
+                        "fullName": f"Player {batter}",
+                        "link": f"/api/v1/people/{batter}",
+                    },
+                    "batSide": {"code": "R", "description": "Right"},
+                    "pitcher": {
+                        "id": pitcher,
+                        "fullName": f"Player {pitcher}",
+                        "link": f"/api/v1/people/{pitcher}",
+                    },
+                    "pitchHand": {"code": "R", "description": "Right"},
+                    "splits": {
+                        "batter": "vs_RHP",
+                        "pitcher": "vs_RHB",
+                        "menOnBase": "Empty",
+                    },
+                }
+                for name, occupied in zip(
+                    ("postOnFirst", "postOnSecond", "postOnThird"), bases
+                ):
+                    if occupied:
+                        matchup[name] = {
+                            "id": 1,
+                            "fullName": "Runner",
+                            "link": "/api/v1/people/1",
+                        }
+                plays.append(
+                    {
+                        "result": {
+                            "type": "atBat",
+                            "event": event,
+                            "eventType": event.lower().replace(" ", "_"),
+                            "description": f"Player {batter} {event.lower()}.",
+                            "rbi": scored,
+                            "awayScore": score["top"],
+                            "homeScore": score["bottom"],
+                            "isOut": made > 0,
+                        },
+                        "about": {
+                            "atBatIndex": len(plays),
+                            "halfInning": half,
+                            "isTopInning": half == "top",
+                            "inning": inning,
+                            "startTime": start.isoformat() + ".000Z",
+                            "endTime": clock.isoformat() + ".000Z",
+                            "isComplete": True,
+                            "isScoringPlay": scored > 0,
+                            "hasReview": False,
+                            "hasOut": made > 0,
+                            "captivatingIndex": rng.randint(0, 100),
+                        },
+                        "count": {
+                            "balls": rng.randint(0, 3),
+                            "strikes": rng.randint(0, 2),
+                            "outs": outs,
+                        },
+                        "matchup": matchup,
+                        "pitchIndex": list(range(rng.randint(1, 7))),
+                        "actionIndex": [],
+                        "runnerIndex": list(range(len(runners))),
+                        "runners": runners,
+                        "playEvents": pitch_events(rng, rng.randint(1, 7)),
+                        "playEndTime": clock.isoformat() + ".000Z",
+                    }
+                )
+                if half == "bottom" and inning >= 9 and score["bottom"] > score["top"]:
+                    break
+        if inning >= 9 and score["top"] != score["bottom"]:
+            break
+    return {
+        "copyright": "Synthetic data for benchmarking",
+        "allPlays": plays,
+        "currentPlay": plays[-1],
+        "scoringPlays": [
+            i for i, play in enumerate(plays) if play["about"]["isScoringPlay"]
+        ],
+        "playsByInning": [],
+    }
+
+
+def season_list(count: int) -> list[int]:
+    return list(range(LAST_SEASON - count + 1, LAST_SEASON + 1))
+
+
+def populate_database(
+    seasons: list[int],
+    games_per_season: int = GAMES_PER_SEASON,
+    batch_size: int = 5000,
+    seed: int = 0,
+) -> dict:
+    """Fill the configured database with synthetic seasons through the real ingestion
+    path, returning how long payload decoding and row writing took"""
+    from sqlalchemy import insert
+
+    from backend.data_collection import (
+        BatchWriter,
+        ParsedGame,
+        build_play_by_play_rows,
+        upsert_players,
+    )
+    from backend.db import session_scope
+    from backend.archive import archive_payload
+    from backend.migrations import migrate_db
+    from backend.models import Games
+    from backend.payloads import iter_plays
+
+    migrate_db()
+    upsert_players(player_rows(seasons), seasons)
+    stats = dict(games=0, plays=0, payload_bytes=0, parse_s=0.0, write_s=0.0)
+    gameid = 1
+    with BatchWriter(batch_size) as writer:
+        for season in seasons:
+            games = schedule(season, games_per_season, gameid)
+            gameid += len(games)
+            with session_scope() as session:
+                session.execute(insert(Games), games)
+            for game in games:
+                content = json.dumps(game_payload(game, seed)).encode()
+                start = time.perf_counter()
+                plays, innings = build_play_by_play_rows(
+                    game["gameid"], iter_plays(content)
+                )
+                parsed = time.perf_counter()
+                writer.add(
+                    ParsedGame(
+                        game["gameid"],
+                        plays,
+                        innings,
+                        archive_payload(content),
+                        game["status"],
+                    )
+                )
+                stats["parse_s"] += parsed - start
+                stats["write_s"] += time.perf_counter() - parsed
+                stats["games"] += 1
+                stats["plays"] += len(plays)
+                stats["payload_bytes"] += len(content)
+        start = time.perf_counter()
+        writer.flush()
+        stats["write_s"] += time.perf_counter() - start
+    return stats
+
+
+@click.command()
+@click.argument("db_path", type=click.Path(dir_okay=False))
+@click.option("--seasons", type=click.IntRange(1, 20), default=1, show_default=True)
+@click.option(
+    "--games-per-season", type=int, default=GAMES_PER_SEASON, show_default=True
+)
+@click.option("--seed", type=int, default=0, show_default=True)
+def main(db_path, seasons, games_per_season, seed):
+    if Path(db_path).exists():
+        raise click.ClickException(f"{db_path} already exists")
+    # Settings are read when backend.constants is imported, so set them first
+    os.environ["MLB_DATABASE_URL"] = f"sqlite:///{Path(db_path).resolve()}"
+    stats = populate_database(season_list(seasons), games_per_season, seed=seed)
+    print(
+        f"{stats['games']} games, {stats['plays']} plays, "
+        f"{stats['payload_bytes'] / 1e6:.0f} MB of payloads"
+    )
+
+
+if __name__ == "__main__":
+    main()
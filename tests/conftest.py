@@ -0,0 +1,45 @@
+"""Shared fixtures: the tests run against one small synthetic database
+
+Settings are read when backend.constants is imported, so they point at a
+temporary directory before any backend module is loaded.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+DATA_DIR = Path(tempfile.mkdtemp(prefix="mlb-tests-"))
+os.environ["MLB_DATABASE_URL"] = f"sqlite:///{DATA_DIR / 'playbyplay.db'}"
+os.environ["MLB_SNAPSHOT_DIR"] = str(DATA_DIR / "snapshots")
+os.environ["MLB_ARCHIVE_DIR"] = str(DATA_DIR / "archive")
+os.environ["MLB_PREWARM"] = "0"
+# Tests assert on results, not on the 202 a slow request would get
+os.environ["MLB_JOB_WAIT_SECONDS"] = "600"
+
+SEASON = 2025
+# A season with no games at all
+EMPTY_SEASON = 1999
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def season() -> int:
+    from benchmarks.synthetic import populate_database
+
+    populate_database([SEASON], games_per_season=60)
+    return SEASON
+
+
+@pytest.fixture
+def client(season):
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    return TestClient(app)
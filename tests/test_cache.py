@@ -0,0 +1,42 @@
+import threading
+
+from backend.cache import FrameCache
+
+
+def test_version_read_does_not_block_lookups():
+    reading = threading.Event()
+    release = threading.Event()
+    versions = {2025: 1}
+
+    def slow_versions():
+        reading.set()
+        release.wait(5)
+        return dict(versions)
+
+    cache = FrameCache(1 << 20, slow_versions, version_check_seconds=60)
+    cache._versions = dict(versions)
+    cache.put("frame", "cached", season=2025)
+    refresher = threading.Thread(target=cache.refresh_versions, kwargs=dict(force=True))
+    refresher.start()
+    assert reading.wait(5)
+    # Served from the cache while the first read is still waiting on the database
+    lookup = threading.Thread(target=lambda: cache.get("frame"))
+    lookup.start()
+    lookup.join(1)
+    assert not lookup.is_alive()
+    release.set()
+    refresher.join(5)
+    assert cache.get("frame") == "cached"
+
+
+def test_bumped_season_drops_its_entries():
+    versions = {2024: 1, 2025: 1}
+    cache = FrameCache(1 << 20, lambda: dict(versions), version_check_seconds=0)
+    cache.refresh_versions()
+    cache.put("2024", "a", season=2024)
+    cache.put("2025", "b", season=2025)
+    cache.put("all", "c")
+    versions[2025] = 2
+    assert cache.get("2024") == "a"
+    assert cache.get("2025") is None
+    assert cache.get("all") is None
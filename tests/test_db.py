@@ -0,0 +1,38 @@
+from sqlalchemy import func, select
+from sqlmodel import Session
+
+from backend.constants import SQLITE_MAX_VARIABLES
+from backend.data_collection import merge_player_rows, upsert_players
+from backend.db import chunked, get_read_engine
+from backend.models import Players
+
+
+def test_chunks_cover_every_row_under_the_parameter_limit():
+    rows = [dict(a=i, b=i) for i in range(SQLITE_MAX_VARIABLES + 1)]
+    chunks = list(chunked(rows, 2))
+    assert [row for chunk in chunks for row in chunk] == rows
+    assert all(len(chunk) * 2 <= SQLITE_MAX_VARIABLES for chunk in chunks)
+    assert list(chunked(rows[:1], SQLITE_MAX_VARIABLES * 2)) == [rows[:1]]
+
+
+def test_players_upsert_spanning_several_statements(season):
+    year = 1998
+    people = [
+        {
+            "id": 10_000_000 + i,
+            "fullName": f"Player {i}",
+            "primaryPosition": {"code": "1"},
+        }
+        for i in range(SQLITE_MAX_VARIABLES // 2)
+    ]
+    rows = merge_player_rows({year: people})
+    assert upsert_players(rows, [year]) == len(people)
+    # A second pass finds nothing changed
+    assert upsert_players(rows, [year]) == 0
+    with Session(get_read_engine()) as session:
+        stored = session.scalar(
+            select(func.count())
+            .select_from(Players)
+            .where(Players.playerid >= 10_000_000)
+        )
+    assert stored == len(people)
@@ -0,0 +1,36 @@
+import polars as pl
+
+from backend.db import get_read_engine, session_scope
+from backend.mlbmodels.incremental import (
+    pending_seasons,
+    refresh_pending_seasons,
+    reset_season,
+)
+from backend.mlbmodels.re24 import get_re24_specific_year
+
+
+def test_refresh_folds_in_every_season_with_new_games(season):
+    refresh_pending_seasons()
+    assert pending_seasons() == []
+    assert refresh_pending_seasons() == {}
+
+    # What ingestion leaves behind when it replaces a game the season had aggregated
+    with session_scope() as session:
+        reset_season(session, season)
+    assert pending_seasons() == [season]
+    added = refresh_pending_seasons()
+    assert list(added) == [season] and added[season] > 0
+    assert pending_seasons() == []
+
+
+def test_refreshed_re24_matches_a_full_computation(season):
+    refresh_pending_seasons()
+    with get_read_engine().connect() as connection:
+        stored = pl.read_database(
+            "SELECT base_state, outs, expected_runs, count FROM yearlyre24 "
+            f"WHERE year = {season} ORDER BY base_state, outs",
+            connection,
+        )
+    full = get_re24_specific_year(season)
+    assert stored["count"].to_list() == full["count"].to_list()
+    assert (stored["expected_runs"] - full["expected_runs"]).abs().max() < 1e-3
@@ -0,0 +1,49 @@
+from sqlalchemy import func, select
+from sqlmodel import Session
+
+from backend.constants import SQLITE_MAX_VARIABLES
+from backend.db import get_read_engine, session_scope
+from backend.ledger import mark_done, mark_failed
+from backend.models import IngestionLedger
+
+FIRST_GAME = 90_000_000
+
+
+def stored_entries(first: int, last: int) -> int:
+    with Session(get_read_engine()) as session:
+        return session.scalar(
+            select(func.count())
+            .select_from(IngestionLedger)
+            .where(IngestionLedger.gameid.between(first, last))
+        )
+
+
+def test_mark_done_spanning_several_statements(season):
+    games = [
+        (FIRST_GAME + i, f"hash{i}", "Final") for i in range(SQLITE_MAX_VARIABLES // 3)
+    ]
+    with session_scope() as session:
+        mark_done(session, games)
+    assert stored_entries(FIRST_GAME, FIRST_GAME + len(games)) == len(games)
+
+
+def attempts(gameid: int) -> int:
+    with Session(get_read_engine()) as session:
+        return session.scalar(
+            select(IngestionLedger.attempts).where(IngestionLedger.gameid == gameid)
+        )
+
+
+def test_attempts_count_failures_since_the_game_was_last_stored(season):
+    gameid = FIRST_GAME - 1
+    with session_scope() as session:
+        mark_done(session, [(gameid, "hash", "Final")])
+    assert attempts(gameid) == 0
+    mark_failed(gameid, "boom")
+    mark_failed(gameid, "boom")
+    assert attempts(gameid) == 2
+    with session_scope() as session:
+        mark_done(session, [(gameid, "hash", "Final")])
+    assert attempts(gameid) == 0
+    mark_failed(gameid, "boom")
+    assert attempts(gameid) == 1
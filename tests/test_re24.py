@@ -0,0 +1,43 @@
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from backend.mlbmodels.markov import markov_re24
+from backend.mlbmodels.re24 import get_re24_specific_year
+
+from .conftest import EMPTY_SEASON
+
+STATE = ["base_state_before", "previous_outs"]
+
+
+def test_markov_table_is_shaped_like_the_empirical_one(season):
+    empirical = get_re24_specific_year(season)
+    markov = markov_re24([season])
+    assert markov.schema == empirical.schema
+    assert_frame_equal(markov.drop("expected_runs"), empirical.drop("expected_runs"))
+
+
+def test_markov_expected_runs_stay_close_to_the_empirical_means(season):
+    joined = get_re24_specific_year(season).join(
+        markov_re24([season]), on=STATE, suffix="_markov"
+    )
+    # Each state borrows from the states it leads to, so the two agree only on
+    # average: weight by how often each state occurs
+    gap = joined.select(
+        (
+            (pl.col("expected_runs") - pl.col("expected_runs_markov")).abs()
+            * pl.col("count")
+        ).sum()
+        / pl.col("count").sum()
+    ).item()
+    assert gap < 0.1
+
+
+def test_re24_endpoint_serves_the_markov_table(client, season):
+    response = client.get(f"/re24/{season}", params={"method": "markov"})
+    assert response.status_code == 200
+    assert len(response.json()) == markov_re24([season]).height
+    assert client.get(f"/re24/{season}", params={"method": "mean"}).status_code == 422
+
+
+def test_markov_table_of_a_season_without_plays_is_empty(season):
+    assert markov_re24([EMPTY_SEASON]).is_empty()
@@ -0,0 +1,27 @@
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from backend.db import get_read_engine
+from backend.mlbmodels.recompute import recompute_seasons
+
+from .conftest import EMPTY_SEASON
+
+
+def stored_outputs(season: int) -> dict[str, pl.DataFrame]:
+    with get_read_engine().connect() as connection:
+        frames = {
+            table: pl.read_database(
+                f"SELECT * FROM {table} WHERE year = {season}", connection
+            ).drop("id")
+            for table in ("yearlyre24", "batterrunvalue", "pitcherrunvalue")
+        }
+    return {table: frame.sort(frame.columns) for table, frame in frames.items()}
+
+
+def test_worker_processes_store_what_the_serial_path_does(season):
+    assert recompute_seasons([season]) == [season]
+    serial = stored_outputs(season)
+    written = recompute_seasons([season, EMPTY_SEASON], workers=2)
+    assert sorted(written) == [EMPTY_SEASON, season]
+    for table, frame in stored_outputs(season).items():
+        assert_frame_equal(frame, serial[table])
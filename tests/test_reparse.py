@@ -0,0 +1,12 @@
+from polars.testing import assert_frame_equal
+
+from backend.mlbmodels.plays import load_year_from_db
+from backend.reparse import archived_games, reparse_archive
+
+
+def test_worker_processes_rebuild_the_same_plays(season):
+    before = load_year_from_db(season).sort("gameid", "ab_index")
+    games = archived_games([season])
+    assert games
+    assert reparse_archive([season], workers=2) == len(games)
+    assert_frame_equal(load_year_from_db(season).sort("gameid", "ab_index"), before)
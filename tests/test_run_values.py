@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import func, select
+from sqlmodel import Session
+
+from backend.db import get_read_engine
+from backend.models import BatterRunValue, PitcherRunValue
+
+from .conftest import EMPTY_SEASON
+
+
+@pytest.mark.parametrize(
+    "role, model", [("batters", BatterRunValue), ("pitchers", PitcherRunValue)]
+)
+def test_season_without_plays_has_empty_leaderboard(client, role, model):
+    response = client.get(f"/run-value/{role}/{EMPTY_SEASON}")
+    assert response.status_code == 200
+    assert response.json() == []
+    with Session(get_read_engine()) as session:
+        stored = session.scalar(
+            select(func.count()).select_from(model).where(model.year == EMPTY_SEASON)
+        )
+    assert stored == 0
+
+
+@pytest.mark.parametrize("role", ["batters", "pitchers"])
+def test_leaderboard_is_stored_once(client, season, role):
+    first = client.get(f"/run-value/{role}/{season}?min_ab=0").json()
+    second = client.get(f"/run-value/{role}/{season}?min_ab=0").json()
+    assert first and first == second
+    assert len({row["playerid"] for row in first}) == len(first)
@@ -0,0 +1,28 @@
+from backend.constants import SQLITE_MAX_VARIABLES
+from backend.schedule import upsert_games
+
+SEASON = 1997
+
+
+def schedule_rows(count: int, status: str) -> list[dict]:
+    return [
+        dict(
+            gameid=80_000_000 + i,
+            gameguid=f"guid-{i}",
+            game_date="1997-04-01",
+            away_team_id=1,
+            home_team_id=2,
+            game_type="R",
+            season=SEASON,
+            status=status,
+        )
+        for i in range(count)
+    ]
+
+
+def test_upsert_spanning_several_statements_counts_only_changes(season):
+    rows = schedule_rows(SQLITE_MAX_VARIABLES // 4, "Scheduled")
+    assert upsert_games(SEASON, rows) == len(rows)
+    assert upsert_games(SEASON, rows) == 0
+    rows[-1]["status"] = "Final"
+    assert upsert_games(SEASON, rows) == 1
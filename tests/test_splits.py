@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from backend.cache import frame_cache, read_season_versions
+from backend.mlbmodels.splits import build_cube, cube_path, get_split_cube
+
+from .conftest import EMPTY_SEASON
+
+
+def test_concurrent_rebuilds_leave_one_readable_cube(season):
+    path = cube_path(season, read_season_versions().get(season, 0))
+    path.unlink(missing_ok=True)
+
+    def rebuild(_):
+        frame_cache.clear()
+        return get_split_cube(season)
+
+    with ThreadPoolExecutor(4) as pool:
+        cubes = list(pool.map(rebuild, range(8)))
+    on_disk = pl.read_parquet(path)
+    # Sums are float; the parallel group-by may add them in a different order
+    for cube in cubes:
+        assert_frame_equal(cube, on_disk)
+    assert not list(path.parent.glob("*.tmp"))
+
+
+def test_season_without_plays_writes_no_cube(season):
+    cube = get_split_cube(EMPTY_SEASON)
+    assert cube.is_empty()
+    assert not cube_path(EMPTY_SEASON, 0).parent.exists()
+
+
+def test_cube_matches_a_fresh_build(season):
+    from backend.mlbmodels.re24 import get_annotated_year
+
+    assert_frame_equal(get_split_cube(season), build_cube(get_annotated_year(season)))
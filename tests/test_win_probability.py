@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.cache import frame_cache
+from backend.mlbmodels.win_probability import (
+    WinProbabilityGrid,
+    get_win_probability_grid,
+    grid_path,
+)
+
+
+def test_concurrent_saves_leave_one_readable_grid(season):
+    grid = get_win_probability_grid()
+    path = grid_path()
+
+    def save(_):
+        grid.save(path)
+        return WinProbabilityGrid.load(path)
+
+    with ThreadPoolExecutor(4) as pool:
+        loaded = list(pool.map(save, range(8)))
+    for other in loaded:
+        np.testing.assert_allclose(other.win_probability, grid.win_probability)
+        assert other.versions == grid.versions
+    assert not list(path.parent.glob("*.tmp"))
+
+
+def test_grid_is_rebuilt_when_the_file_is_stale(season):
+    grid = get_win_probability_grid()
+    stale = WinProbabilityGrid(grid.win_probability, grid.leverage_index, {})
+    stale.save(grid_path())
+    frame_cache.clear()
+    assert get_win_probability_grid().versions == grid.versions
+    assert WinProbabilityGrid.load(grid_path()).versions == grid.versions